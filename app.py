@@ -1,24 +1,30 @@
 import time
 import os
+import sys
+import signal
 import threading
 import logging
 import json
-import io
-import requests
+import zlib
+from urllib.parse import quote
 from datetime import datetime
-from flask import Flask, render_template, jsonify, request
-
-# 引入 mutagen 用于获取时长
-from mutagen import File
-from mutagen.mp3 import MP3
-from mutagen.mp4 import MP4
+from flask import Flask, render_template, jsonify, request, Response
 
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 log.propagate = False
 
 import database
-from music_apis import search_and_get_url
+import duration_probe
+from ha_client import HAClient
+from ha_events import HAEventStream
+from event_hub import EventHub
+from log_writer import LogWriter
+import playlist_io
+from resolve_jobs import ResolveJobManager
+from play_queue import PlaylistQueue, REPEAT_MODES
+from music_apis import search_and_get_url, get_api_stats, invalidate_cached_url, next_candidate, refresh_play_url, BREAKER_OPEN_MSG
+from music_apis.cache import CACHE_TTL as URL_CACHE_TTL
 
 # ... (配置区域) ...
 HA_URL = os.getenv("HA_URL", "http://192.168.1.X:8123")
@@ -26,6 +32,19 @@ HA_TOKEN = os.getenv("HA_TOKEN", "")
 PLAYER_ENTITY_ID = os.getenv("PLAYER_ENTITY_ID", "")
 CONVERSATION_ENTITY_ID = os.getenv("CONVERSATION_ENTITY_ID", "")
 MUSIC_SOURCE = os.getenv("MUSIC_SOURCE", "all")
+PREFETCH_COUNT = int(os.getenv("PREFETCH_COUNT", "2"))   # 歌单预取后续几首
+PREFETCH_TTL = int(os.getenv("PREFETCH_TTL", "900"))     # 预取结果有效期 (秒)
+HA_STATE_TTL = float(os.getenv("HA_STATE_TTL", "1.0"))   # HA 实体状态缓存时间 (秒)
+HA_WEBSOCKET = os.getenv("HA_WEBSOCKET", "1") == "1"      # 通过 WebSocket 订阅 HA 状态变化
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "1000"))  # 异步日志队列容量
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "block")  # 队列满时: block 短暂等待 / drop 直接丢弃
+LOG_RETENTION_ROWS = int(os.getenv("LOG_RETENTION_ROWS", "50000"))  # 日志最多保留条数 (0 不限)
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "30"))     # 日志最多保留天数 (0 不限)
+RESOLVE_CONCURRENCY = int(os.getenv("RESOLVE_CONCURRENCY", "2"))  # 歌单预解析同时解析几首
+RESOLVE_TTL = int(os.getenv("RESOLVE_TTL", "21600"))             # 预解析结果有效期 (秒)，过期后重新解析
+PLAYLIST_SHUFFLE = os.getenv("PLAYLIST_SHUFFLE", "0") == "1"      # 歌单默认随机播放
+PLAYLIST_REPEAT = os.getenv("PLAYLIST_REPEAT", "all")            # 循环模式: all 列表循环 / one 单曲循环 / off 播完停止
+DEAD_URL_WINDOW = int(os.getenv("DEAD_URL_WINDOW", "15"))         # 推送后多久内播放器没进入播放状态视为链接失效 (秒)
 
 app = Flask(__name__)
 
@@ -37,87 +56,110 @@ system_status = {
     # 歌单播放状态
     "playlist_mode": False,
     "current_playlist_name": "",
-    "queue": [], 
+    "queue": None,  # PlaylistQueue，按需从数据库读取歌曲
     "current_index": -1,
     "playing_start_time": 0,
     "current_duration": 0,
+    "play_seq": 0,  # 每次推送新曲目自增，后台任务据此判断结果是否已过时
     
     # 本地记录当前播放信息，用于前端显示
     "current_track_title": "等待播放", 
-    "current_track_source": ""
+    "current_track_source": "",
+    "current_query": ""  # 当前曲目的搜索词，切换候选时使用
 }
 
 # === 辅助功能 ===
-def get_audio_duration(url):
-    """获取网络音频时长"""
-    try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        resp = requests.get(url, headers=headers, stream=True, timeout=5)
-        data = io.BytesIO()
-        for chunk in resp.iter_content(chunk_size=4096):
-            data.write(chunk)
-            if data.tell() > 128 * 1024: break
-        data.seek(0)
-        
-        audio = None
-        try: audio = MP3(data)
-        except:
-            try: 
-                data.seek(0)
-                audio = MP4(data)
-            except: pass
-        
-        if audio and audio.info and audio.info.length:
-            return int(audio.info.length)
-    except:
-        pass
-    return 0
+def get_audio_duration(url, song_key=None):
+    """获取网络音频时长：Range 请求只读文件头 (ID3/Xing/VBRI/moov)，结果按链接和歌曲缓存"""
+    return duration_probe.get_duration(url, song_key)
+
+def track_key(song_info):
+    """时长缓存按 源+歌曲ID 区分：候选切换后同一个歌名、同一个源可能是另一首"""
+    return f"{song_info.get('source_label', 'unknown')}|{song_info.get('id')}"
+
+# 状态/日志变更通知，驱动 /api/events 推送
+event_hub = EventHub(["status", "logs", "logs_reset"])
+
+# 日志异步批量落库，写入完成后再通知 SSE
+log_writer = LogWriter(maxsize=LOG_QUEUE_SIZE, policy=LOG_QUEUE_POLICY,
+                       on_flush=lambda: event_hub.publish("logs"))
+
+def retention_worker():
+    """后台分批清理过期日志，每批之间让出写锁"""
+    while True:
+        try:
+            pruned = 0
+            while True:
+                count = database.prune_logs(LOG_RETENTION_ROWS, LOG_RETENTION_DAYS)
+                if not count: break
+                pruned += count
+                time.sleep(0.05)
+            if pruned:
+                print(f"🧹 [日志清理] 已归档并清理 {pruned} 条过期日志")
+                # 日志版本号变化，带 before_id 翻页等请求的旧 ETag 随之失效
+                event_hub.publish("logs")
+        except Exception as e:
+            print(f"Error in retention: {e}")
+        time.sleep(600)
 
 def record_action(action_type, detail, status, api_response="", duration=0):
     system_status["total_calls"] += 1
-    try:
-        database.insert_log(action_type, detail, status, str(api_response)[:500], duration)
-    except:
-        pass
+    log_writer.submit(action_type, detail, status, api_response, duration)
+
+# 所有 HA REST 请求共用一个连接池，实体状态短时缓存
+ha_client = HAClient(HA_URL, HA_TOKEN, state_ttl=HA_STATE_TTL)
 
 def call_ha_service(domain, service, service_data):
-    url = f"{HA_URL}/api/services/{domain}/{service}"
-    headers = {"Authorization": f"Bearer {HA_TOKEN}", "Content-Type": "application/json"}
-    try:
-        requests.post(url, headers=headers, json=service_data, timeout=5)
-        return True
-    except:
-        return False
+    return ha_client.call_service(domain, service, service_data)
 
 def get_ha_player_info():
     """获取播放器的状态"""
     if not PLAYER_ENTITY_ID:
         return "unknown", {}
         
-    url = f"{HA_URL}/api/states/{PLAYER_ENTITY_ID}"
-    headers = {"Authorization": f"Bearer {HA_TOKEN}", "Content-Type": "application/json"}
-    try:
-        response = requests.get(url, headers=headers, timeout=2)
-        if response.status_code == 200:
-            data = response.json()
-            state = data.get('state', 'unknown')
-            attrs = data.get('attributes', {})
-            return state, attrs
-    except:
-        pass
+    data = ha_client.get_state(PLAYER_ENTITY_ID, timeout=2)
+    if data:
+        return data.get('state', 'unknown'), data.get('attributes', {})
     return "unknown", {}
 
 def get_ha_state(entity_id):
     """获取实体状态"""
-    url = f"{HA_URL}/api/states/{entity_id}"
-    headers = {"Authorization": f"Bearer {HA_TOKEN}", "Content-Type": "application/json"}
-    try:
-        response = requests.get(url, headers=headers, timeout=5)
-        if response.status_code == 200:
-            return response.json().get('state')
-    except:
-        pass
-    return None
+    data = ha_client.get_state(entity_id, timeout=5)
+    return data.get('state') if data else None
+
+# === HA 事件订阅 (连接失败时回退 REST 轮询) ===
+monitor_wakeup = threading.Event()
+def on_ha_change(entity_id):
+    monitor_wakeup.set()
+    if entity_id == PLAYER_ENTITY_ID:
+        event_hub.publish("status")
+
+ha_stream = HAEventStream(HA_URL, HA_TOKEN, [CONVERSATION_ENTITY_ID, PLAYER_ENTITY_ID], on_change=on_ha_change)
+
+def read_conversation_text():
+    if ha_stream.connected:
+        return ha_stream.get(CONVERSATION_ENTITY_ID)[0]
+    return get_ha_state(CONVERSATION_ENTITY_ID)
+
+def read_player_info():
+    if not PLAYER_ENTITY_ID:
+        return "unknown", {}
+    if ha_stream.connected:
+        state, attrs = ha_stream.get(PLAYER_ENTITY_ID)
+        return state or "unknown", attrs
+    return get_ha_player_info()
+
+def get_media_position(ha_attrs):
+    """HA 只在状态变化时更新 media_position，播放中需按 media_position_updated_at 推算当前进度"""
+    pos = float(ha_attrs['media_position'])
+    updated_at = ha_attrs.get('media_position_updated_at')
+    if updated_at:
+        try:
+            updated = datetime.fromisoformat(str(updated_at))
+            pos += max(0, (datetime.now(updated.tzinfo) - updated).total_seconds())
+        except ValueError:
+            pass
+    return pos
 
 def play_url_on_ha(url, song_name):
     return call_ha_service("media_player", "play_media", {
@@ -130,46 +172,294 @@ def play_url_on_ha(url, song_name):
         }
     })
 
+# === 歌单预取 ===
+# 当前歌曲播放期间，后台提前解析后续几首的链接和时长，切歌时只需一次 play_media
+prefetch_cache = {}  # (song_id, song_name) -> {"song_info", "play_url", "duration", "resolved_at"}
+prefetch_lock = threading.Lock()
+prefetch_event = threading.Event()
+
+def _prefetch_key(song_data):
+    return (song_data.get('id'), song_data['name'])
+
+def get_prefetched(song_data):
+    """取出未过期的预取结果"""
+    with prefetch_lock:
+        entry = prefetch_cache.get(_prefetch_key(song_data))
+    if entry and time.time() - entry['resolved_at'] < PREFETCH_TTL:
+        return entry
+    return None
+
+def drop_prefetched(song_data):
+    with prefetch_lock:
+        prefetch_cache.pop(_prefetch_key(song_data), None)
+
+def schedule_prefetch():
+    prefetch_event.set()
+
+def _upcoming_songs():
+    queue = system_status["queue"]
+    if not system_status["playlist_mode"] or not queue: return []
+    upcoming = queue.upcoming(max(system_status["current_index"], 0), PREFETCH_COUNT)
+    # 已有有效预解析结果的不用再预取；存的链接快过期的也放进来，由预取线程按 ID 提前换新
+    return [s for s in upcoming if not stored_resolution(s) or stored_url_stale(s, URL_CACHE_TTL * 2 / 3)]
+
+def prefetch_worker():
+    while True:
+        # 定期醒来，顺便刷新快过期的链接
+        prefetch_event.wait(timeout=60)
+        prefetch_event.clear()
+        try:
+            upcoming = _upcoming_songs()
+            wanted = {_prefetch_key(s) for s in upcoming}
+            with prefetch_lock:
+                for key in [k for k in prefetch_cache if k not in wanted]:
+                    del prefetch_cache[key]
+
+            for song_data in upcoming:
+                stored = stored_resolution(song_data)
+                if stored and refresh_stored_url(song_data, stored): continue
+                key = _prefetch_key(song_data)
+                with prefetch_lock:
+                    entry = prefetch_cache.get(key)
+                age = time.time() - entry['resolved_at'] if entry else None
+                # 超过有效期 2/3 就提前刷新，旧结果在刷新完成前继续可用
+                if age is not None and age < PREFETCH_TTL * 2 / 3:
+                    continue
+                if entry:
+                    invalidate_cached_url(song_data['name'], "all")
+
+                success, msg, song_info, play_url, error_logs = search_and_get_url(song_data['name'], source="all")
+                if not success: continue
+                duration = get_audio_duration(play_url, track_key(song_info))
+                with prefetch_lock:
+                    prefetch_cache[key] = {
+                        "song_info": song_info,
+                        "play_url": play_url,
+                        "duration": duration,
+                        "resolved_at": time.time()
+                    }
+                print(f"📥 [预取完成] {song_data['name']} ({song_info.get('source_label', 'unknown')})")
+        except Exception as e:
+            print(f"Error in prefetch: {e}")
+
+# === 歌单预解析 (结果存入 playlist_songs) ===
+def resolve_song(song_name, force=False):
+    if force: invalidate_cached_url(song_name, "all")
+    success, msg, song_info, play_url, error_logs = search_and_get_url(song_name, source="all")
+    if not success: return None
+    source = song_info.get('source_label', 'unknown')
+    return {
+        "url": play_url,
+        "source": source,
+        "source_id": song_info.get('id'),
+        "duration": get_audio_duration(play_url, track_key(song_info))
+    }
+
+resolve_jobs = ResolveJobManager(resolve_song, concurrency=RESOLVE_CONCURRENCY, ttl=RESOLVE_TTL)
+
+def stored_resolution(song_data):
+    """歌单行里存的解析结果，未解析、失败或过期返回 None"""
+    if song_data.get('resolve_status') != 'ok' or not song_data.get('url'): return None
+    if time.time() - (song_data.get('resolved_at') or 0) > RESOLVE_TTL: return None
+    return song_data
+
+def stored_url_stale(stored, max_age=URL_CACHE_TTL):
+    """存的源和歌曲 ID 长期有效，链接本身会过期"""
+    return time.time() - (stored.get('resolved_at') or 0) > max_age
+
+def refresh_stored_url(song_data, stored):
+    """用存的 ID 直接换新链接并写回歌单行，不重新搜索；失败返回 False"""
+    fresh_url = refresh_play_url(stored['source'], stored['source_id'])
+    if not fresh_url: return False
+    print(f"🔄 [链接刷新] {stored['source']} | {song_data['name']}")
+    save_resolution(song_data, {"id": stored['source_id'], "source_label": stored['source']},
+                    fresh_url, stored['duration'])
+    return True
+
+def save_resolution(song_data, song_info, play_url, duration):
+    """歌单播放时现搜的结果也写回，下次直接用"""
+    result = {"id": song_data['id'], "success": True, "url": play_url,
+              "source": song_info.get('source_label', 'unknown'), "source_id": song_info.get('id'), "duration": duration}
+    database.save_song_resolutions([result])
+    song_data.update(url=play_url, source=result['source'], source_id=result['source_id'],
+                     duration=duration, resolved_at=time.time(), resolve_status='ok')
+
+# === 播放后处理 (不阻塞推送) ===
+def run_after_push(seq, play_url, song_key, logs, probe=True, on_probed=None):
+    """
+    HA 推送完成后再做的事：探测时长回填 current_duration、写日志
+    在后台线程执行，指令到出声的延迟不再包含探测和写库时间
+    """
+    def task():
+        if probe:
+            duration = get_audio_duration(play_url, song_key)
+            # 期间已经切到别的歌，就不要覆盖
+            if system_status["play_seq"] == seq:
+                system_status["current_duration"] = duration or 210
+            if on_probed: on_probed(duration)
+        for args in logs:
+            record_action(*args)
+    threading.Thread(target=task, daemon=True).start()
+
+# === 候选切换 ===
+def play_alternate(query, sources="all", song_data=None):
+    """当前链接不可用：直接用下一个候选结果推送，不重新搜索；候选用尽或 HA 推送失败返回 False"""
+    success, msg, song_info, play_url, error_logs = next_candidate(query, sources)
+    if not success: return False
+    real_source = song_info.get('source_label', 'unknown')
+    system_status["play_seq"] += 1
+    system_status["current_duration"] = 210
+    if not play_url_on_ha(play_url, song_info['name']): return False
+
+    system_status["playing_start_time"] = time.time()
+    system_status["current_track_title"] = song_info['name']
+    system_status["current_track_source"] = real_source
+    event_hub.publish("status")
+    watch_push(play_url, query, sources, song_data)
+    run_after_push(system_status["play_seq"], play_url, track_key(song_info),
+                   [("候选切换", f"{song_info['name']} (源:{real_source})", "成功", play_url, 0)])
+    return True
+
+# === 链接失效检测 ===
+# 推送成功只说明 HA 收到了指令；链接是否能播要看播放器随后的状态
+# 推送后窗口期内一直没进入播放 (或缓冲后又回到 idle)，判定链接失效，切换到下一个候选
+push_watch = {"seq": 0}
+
+def watch_push(url, query, sources="all", song_data=None, stored=False):
+    """stored: 推送的是歌单里存的预解析链接，失效时要标记重新解析"""
+    push_watch.update(seq=system_status["play_seq"], at=time.time(), url=url, query=query, sources=sources,
+                      song_data=song_data, stored=stored, loading=False)
+
+def check_pushed_url():
+    """
+    由监控线程调用；只在能读到播放器状态时判断，HA 不可达时什么都不做
+    只有播放器停在 idle、当前媒体仍是推送的链接、且从未进入 playing 才算链接失效
+    off 等其他状态是用户关了音箱或停止播放，不算链接失效
+    """
+    seq = push_watch.get("seq")
+    if not seq or seq != system_status["play_seq"]: return
+    state, attrs = read_player_info()
+    if state in ('unknown', 'unavailable'): return
+    if state == 'buffering':
+        push_watch["loading"] = True
+        return
+    if state != 'idle':
+        # playing / paused 说明链接能放；off 是用户操作
+        push_watch["seq"] = 0
+        return
+    waited = time.time() - push_watch["at"] >= DEAD_URL_WINDOW
+    if (attrs or {}).get('media_content_id') != push_watch["url"]:
+        # 播放器还没换到推送的链接，或用户已经放了别的；窗口期过了仍对不上就不再跟踪
+        if waited: push_watch["seq"] = 0
+        return
+    # 缓冲过又回到空闲是加载失败；否则等满窗口期再下结论
+    if not push_watch["loading"] and not waited: return
+
+    push_watch["seq"] = 0
+    query, song_data = push_watch["query"], push_watch["song_data"]
+    print(f"💀 [链接失效] 推送后播放器状态为 {state}，切换候选: {query}")
+    record_action("链接失效", query, "失败", f"播放器状态: {state}", 0)
+    if song_data is not None:
+        drop_prefetched(song_data)
+        if push_watch["stored"]:
+            database.mark_song_failed(song_data['id'])
+            song_data['resolve_status'] = 'failed'
+    if play_alternate(query, push_watch["sources"], song_data):
+        if song_data is not None: schedule_prefetch()
+        return
+    if song_data is not None and system_status["playlist_mode"]:
+        # 候选用尽，跳到下一首
+        system_status["current_index"] += 1
+        play_current_queue_song()
+
 # === 歌单播放逻辑 ===
-def start_playlist_playback(playlist_name):
-    songs = database.get_playlist_songs(playlist_name)
-    if not songs:
+def start_playlist_playback(playlist_name, shuffle=None, repeat=None):
+    queue = PlaylistQueue(playlist_name,
+                          shuffle=PLAYLIST_SHUFFLE if shuffle is None else shuffle,
+                          repeat=repeat or PLAYLIST_REPEAT)
+    if not len(queue):
         return False, "歌单为空"
     
     system_status["playlist_mode"] = True
     system_status["current_playlist_name"] = playlist_name
-    system_status["queue"] = songs
+    system_status["queue"] = queue
     system_status["current_index"] = 0
     
     play_current_queue_song()
     return True, f"开始播放歌单: {playlist_name}"
 
 def play_current_queue_song():
-    if not system_status["queue"]: return
-    
+    """播放当前索引的歌曲；失败顺延下一首，最多把整个歌单试一轮，音源全部熔断时直接停止"""
+    queue = system_status["queue"]
+    if not queue or not len(queue): return
+    for _ in range(len(queue) + 1):
+        if not _play_queue_step(queue): return
+    print("⏹️ [歌单] 整个歌单都没有可播放的歌曲，停止")
+    system_status["playlist_mode"] = False
+    event_hub.publish("status")
+
+
+def _play_queue_step(queue):
+    """尝试播放一首；返回 True 表示这一首放不了，需要继续尝试下一首"""
+    if not len(queue): return False
+
     # === 修改核心：循环逻辑 ===
     # 如果当前索引超出了队列长度，说明刚播完最后一首，现在循环回第一首 (Index 0)
-    if system_status["current_index"] >= len(system_status["queue"]):
+    if system_status["current_index"] >= len(queue):
+        if queue.repeat == "off":
+            print("⏹️ [歌单] 列表播放结束")
+            system_status["playlist_mode"] = False
+            event_hub.publish("status")
+            return False
         print("🔄 [循环模式] 歌单列表播放结束，重置至第一首")
+        queue.next_cycle()
         system_status["current_index"] = 0
+        if not len(queue): return False
 
     idx = system_status["current_index"]
     
-    song_data = system_status["queue"][idx]
+    song_data = queue.song_at(idx)
+    if not song_data:
+        # 播放期间歌曲被删除，按播完一轮处理并重新读取歌单
+        system_status["current_index"] = len(queue)
+        return True
     song_name = song_data['name']
     print(f"\n====== [歌单播放] 第 {idx+1} 首: {song_name} ======")
-
-    success, msg, song_info, play_url, error_logs = search_and_get_url(song_name, source="all")
-    
-    if not success:
-        print(f"❌ [歌单] 搜索失败，跳过")
-        record_action("歌单跳过", song_name, "失败", msg, 0)
-        system_status["current_index"] += 1
-        play_current_queue_song() # 递归调用，会自动处理循环
-        return
-
-    duration = get_audio_duration(play_url)
-    if duration == 0: duration = 210 
+    system_status["current_query"] = song_name
+
+    prefetched = get_prefetched(song_data)
+    stored = None if prefetched else stored_resolution(song_data)
+    if stored and stored_url_stale(stored) and not refresh_stored_url(song_data, stored):
+        # 预取线程通常已提前换新，这里只兜底 (刚开始播放、预取还没轮到)
+        stored = None
+    on_probed = None
+    if prefetched:
+        print(f"⚡ [预取命中] 直接推送")
+        song_info, play_url, duration = prefetched['song_info'], prefetched['play_url'], prefetched['duration']
+    elif stored:
+        print(f"⚡ [预解析命中] 直接推送")
+        song_info = {"id": stored['source_id'], "name": song_name, "source_label": stored['source']}
+        play_url, duration = stored['url'], stored['duration']
+    else:
+        success, msg, song_info, play_url, error_logs = search_and_get_url(song_name, source="all")
+        
+        if not success:
+            if msg == BREAKER_OPEN_MSG:
+                # 所有音源都在熔断，换下一首也一样，停在当前这首等待恢复
+                print(f"🔌 [歌单] 音源均处于熔断状态，暂停播放")
+                record_action("歌单跳过", song_name, "失败", msg, 0)
+                system_status["playlist_mode"] = False
+                event_hub.publish("status")
+                return False
+            print(f"❌ [歌单] 搜索失败，跳过")
+            record_action("歌单跳过", song_name, "失败", msg, 0)
+            system_status["current_index"] += 1
+            return True
+
+        # 时长在推送之后再探测，先用默认值占位；结果连同时长写回歌单
+        duration = 0
+        if song_data.get('id'):
+            on_probed = lambda d, info=song_info, url=play_url: save_resolution(song_data, info, url, d)
     
     real_source = song_info.get('source_label', 'unknown')
     
@@ -177,7 +467,8 @@ def play_current_queue_song():
     print(f"🎉 [歌单选中] 源: {real_source}")
     print(f"🔗 [播放地址] {play_url}")
     
-    system_status["current_duration"] = duration
+    system_status["play_seq"] += 1
+    system_status["current_duration"] = duration or 210
     
     if play_url_on_ha(play_url, song_info['name']):
         system_status["playing_start_time"] = time.time()
@@ -185,35 +476,45 @@ def play_current_queue_song():
         # 更新本地状态
         system_status["current_track_title"] = song_info['name']
         system_status["current_track_source"] = real_source
+        event_hub.publish("status")
         
-        record_action("歌单播放", f"{song_info['name']} (源:{real_source})", "成功", play_url, 0)
+        watch_push(play_url, song_name, "all", song_data, stored=bool(stored))
+        run_after_push(system_status["play_seq"], play_url, track_key(song_info),
+                       [("歌单播放", f"{song_info['name']} (源:{real_source})", "成功", play_url, 0)],
+                       probe=not duration, on_probed=on_probed)
+        schedule_prefetch()
+        return False
     else:
-        # 播放失败，尝试下一首
-        system_status["current_index"] += 1
-        play_current_queue_song()
+        # 推送失败说明 HA 不可达，换链接、换歌都没用；停在当前这首，不动缓存
+        print(f"❌ [歌单] HA 推送失败，暂停播放")
+        record_action("歌单播放", song_name, "失败", "HA调用失败", 0)
+        system_status["playlist_mode"] = False
+        event_hub.publish("status")
+        return False
 
 # === 核心搜索逻辑 ===
 def process_search_and_play(input_text, specified_sources="all"):
-    # 1. 检查是否是歌单
-    all_playlists = database.get_all_playlists()
-    for pl in all_playlists:
-        if pl['name'] == input_text:
-            print(f"🎯 命中本地歌单: {input_text}")
-            start_playlist_playback(input_text)
-            return {"success": True, "msg": f"开始播放歌单: {input_text}"}
+    # 1. 检查是否是歌单 (内存中的歌单名集合，不查库)
+    if database.is_playlist(input_text):
+        print(f"🎯 命中本地歌单: {input_text}")
+        start_playlist_playback(input_text)
+        return {"success": True, "msg": f"开始播放歌单: {input_text}"}
 
     # 2. 单曲搜索模式
     system_status["playlist_mode"] = False
+    system_status["current_query"] = input_text
     t_start = time.time()
     
     success, msg, song_info, play_url, error_logs = search_and_get_url(input_text, source=specified_sources)
 
-    if error_logs:
-        for err in error_logs:
-            record_action("API异常", f"{input_text} (源:{err['source']})", "自动忽略", err['msg'], err['duration'])
+    # 日志统一在推送之后异步写入
+    logs = [("API异常", f"{input_text} (源:{err['source']})", "自动忽略", err['msg'], err['duration'])
+            for err in error_logs or []]
 
     if not success:
-        record_action("任务失败", input_text, "全部失败", msg, int((time.time() - t_start) * 1000))
+        logs.append(("任务失败", input_text, "全部失败", msg, int((time.time() - t_start) * 1000)))
+        for args in logs:
+            record_action(*args)
         return {"success": False, "msg": msg}
 
     real_source = song_info.get('source_label', 'unknown')
@@ -223,12 +524,18 @@ def process_search_and_play(input_text, specified_sources="all"):
     print(f"🎉 [单曲选中] 源: {real_source}")
     print(f"🔗 [播放地址] {play_url}")
 
-    record_action("获取链接", f"{song_info['name']} (源:{real_source})", "成功", play_url, total_duration)
+    logs.append(("获取链接", f"{song_info['name']} (源:{real_source})", "成功", play_url, total_duration))
 
-    if play_url_on_ha(play_url, song_info['name']):
+    pushed = play_url_on_ha(play_url, song_info['name'])
+    system_status["play_seq"] += 1
+    run_after_push(system_status["play_seq"], play_url, None, logs, probe=False)
+
+    if pushed:
         # 更新本地状态
         system_status["current_track_title"] = song_info['name']
         system_status["current_track_source"] = real_source
+        event_hub.publish("status")
+        watch_push(play_url, input_text, specified_sources)
         
         return {"success": True, "msg": f"播放: {song_info['name']}", "data": song_info}
     else:
@@ -254,7 +561,7 @@ def background_monitor():
         try:
             # 1. 语音控制监控
             if CONVERSATION_ENTITY_ID:
-                current_text = get_ha_state(CONVERSATION_ENTITY_ID)
+                current_text = read_conversation_text()
                 # 只有当 current_text 不为空，且真的发生了变化时，才执行
                 if current_text and current_text != last_text and current_text != "unavailable":
                     last_text = current_text
@@ -262,10 +569,13 @@ def background_monitor():
                         keyword = current_text.replace("帮我搜", "").strip()
                         process_search_and_play(keyword, "all")
             
-            # 2. 歌单自动切歌监控
+            # 2. 刚推送的链接是否真的能播
+            check_pushed_url()
+
+            # 3. 歌单自动切歌监控
             if system_status["playlist_mode"]:
                 # 获取播放器真实状态
-                ha_state, ha_attrs = get_ha_player_info()
+                ha_state, ha_attrs = read_player_info()
                 
                 # 关键修复：只有当状态为 'playing' 时才进行计时和切歌判断
                 if ha_state == 'playing':
@@ -274,7 +584,7 @@ def background_monitor():
                     # [优先策略] 使用 HA 返回的媒体进度 (Media Position)
                     if 'media_position' in ha_attrs and 'media_duration' in ha_attrs:
                         try:
-                            current_pos = float(ha_attrs['media_position'])
+                            current_pos = get_media_position(ha_attrs)
                             total_dur = float(ha_attrs['media_duration'])
                             # 如果总时长有效且剩余时间小于 5 秒
                             if total_dur > 0 and (total_dur - current_pos) <= 5:
@@ -295,7 +605,9 @@ def background_monitor():
                     
                     # 执行切歌
                     if should_switch:
-                        system_status["current_index"] += 1
+                        # 单曲循环时自动切歌不前进，手动下一首仍然前进
+                        if system_status["queue"].repeat != "one":
+                            system_status["current_index"] += 1
                         system_status["playing_start_time"] = 0 
                         # 这里的 play_current_queue_song 会处理索引越界并循环
                         play_current_queue_song()
@@ -303,18 +615,38 @@ def background_monitor():
         except Exception as e:
             print(f"Error in monitor: {e}")
         
-        time.sleep(2)
+        # 事件驱动：状态变化立即唤醒；歌单模式下每秒按推算进度检查一次 (纯内存，不发请求)
+        # WebSocket 未连接时按原来的 2 秒轮询
+        if ha_stream.connected:
+            monitor_wakeup.wait(1 if system_status["playlist_mode"] or push_watch["seq"] else 5)
+        else:
+            monitor_wakeup.wait(2)
+        monitor_wakeup.clear()
 
 # === 路由 ===
 @app.route('/')
 def index(): return render_template('dashboard.html')
 
-@app.route('/api/stats')
-def get_stats():
-    db_stats = database.get_source_stats()
+# 成功统计只在有新日志时重新计算
+_db_stats_memo = {"version": None, "data": {"total": 0, "details": {}}}
+# 多个 SSE 连接共享同一份状态快照
+_stats_memo = {"at": 0, "versions": None, "data": None}
+_stats_lock = threading.Lock()
+
+def cached_source_stats():
+    version = (event_hub.version("logs"), event_hub.version("logs_reset"))
+    if _db_stats_memo["version"] != version:
+        data = database.get_source_stats()
+        if data:
+            _db_stats_memo["data"] = data
+            _db_stats_memo["version"] = version
+    return _db_stats_memo["data"]
+
+def build_stats():
+    db_stats = cached_source_stats()
     
     # 1. 获取 HA 真实状态
-    ha_state, ha_attrs = get_ha_player_info()
+    ha_state, ha_attrs = read_player_info()
     
     # 2. 决定显示什么
     display_status = "待机 / 准备就绪"
@@ -342,7 +674,7 @@ def get_stats():
         if system_status["playlist_mode"]:
              display_status = "💿 歌单准备中..."
 
-    return jsonify({
+    return {
         "thread_active": system_status["thread_active"],
         "last_heartbeat": system_status["last_heartbeat"],
         "total_ops": system_status["total_calls"],
@@ -351,11 +683,106 @@ def get_stats():
         "success_count": db_stats['total'],
         "source_details": db_stats['details'],
         "smart_status": display_status,
-        "is_playing": is_playing_anim
-    })
+        "is_playing": is_playing_anim,
+        "api_stats": get_api_stats(),
+        "ha_events": ha_stream.stats(),
+        "ha_client": ha_client.stats(),
+        "log_writer": log_writer.stats(),
+        "play_queue": system_status["queue"].stats() if system_status["queue"] else None
+    }
+
+def shared_stats(max_age=1.0):
+    """有变更通知或超过 max_age 才重新生成，否则所有连接共用上一份"""
+    versions = event_hub.snapshot()
+    with _stats_lock:
+        if (_stats_memo["versions"] != versions or _stats_memo["data"] is None
+                or time.time() - _stats_memo["at"] >= max_age):
+            _stats_memo["data"] = build_stats()
+            _stats_memo["at"] = time.time()
+            _stats_memo["versions"] = versions
+        return _stats_memo["data"]
+
+@app.route('/api/stats')
+def get_stats(): return jsonify(build_stats())
+
+@app.route('/api/events')
+def sse_events():
+    """
+    SSE 推送：status (状态面板) / logs (新增日志)
+    只在有变化时发送；WebSocket 在线时空闲连接几乎不产生开销
+    """
+    def sse(event, data, event_id=None):
+        head = f"id: {event_id}\n" if event_id is not None else ""
+        return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def stream():
+        event_hub.subscribe()
+        try:
+            seen = event_hub.snapshot()
+            logs = database.fetch_logs(limit=30) or []
+            last_log_id = logs[0]['id'] if logs else 0
+            last_status = shared_stats()
+            yield "retry: 3000\n\n"
+            yield sse("status", last_status)
+            yield sse("logs", {"reset": True, "rows": logs}, last_log_id)
+
+            while True:
+                # WebSocket 在线时状态变化由事件驱动，超时只做兜底；否则按原来的 2 秒节奏检查
+                current = event_hub.wait(seen, timeout=15 if ha_stream.connected else 2)
+                changed = {k for k in current if current[k] != seen.get(k)}
+                seen = current
+
+                if "logs_reset" in changed:
+                    last_log_id = 0
+                    yield sse("logs", {"reset": True, "rows": []}, last_log_id)
+                elif "logs" in changed:
+                    rows = database.fetch_logs(limit=30, since_id=last_log_id) or []
+                    if rows:
+                        last_log_id = rows[0]['id']
+                        yield sse("logs", {"reset": False, "rows": rows}, last_log_id)
+
+                status = shared_stats()
+                if status != last_status:
+                    last_status = status
+                    yield sse("status", status)
+                elif not changed:
+                    yield ": ping\n\n"
+        finally:
+            event_hub.unsubscribe()
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# 进程启动标识，避免重启后版本号归零导致旧 ETag 误命中
+BOOT_ID = int(time.time())
 
 @app.route('/api/logs')
-def get_logs(): return jsonify(database.fetch_logs(limit=30))
+def get_logs():
+    """
+    日志查询：支持 since_id / before_id 游标、action_type / status 过滤
+    ETag 由日志版本号生成，日志没有变化时直接返回 304，不读数据库
+    """
+    versions = (event_hub.version("logs"), event_hub.version("logs_reset"))
+    etag = f'W/"{BOOT_ID}-{versions[0]}-{versions[1]}-{zlib.crc32(request.query_string)}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers={"ETag": etag})
+
+    args = request.args
+    logs = database.fetch_logs(
+        limit=min(args.get('limit', 30, type=int), 200),
+        since_id=args.get('since_id', type=int),
+        before_id=args.get('before_id', type=int),
+        action_type=args.get('action_type') or None,
+        status=args.get('status') or None
+    )
+    resp = jsonify(logs if logs else [])
+    resp.headers["ETag"] = etag
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route('/api/stats/daily')
+def get_daily_stats():
+    return jsonify(database.get_daily_stats(days=request.args.get('days', 30, type=int)) or [])
 
 @app.route('/api/manual_exec', methods=['POST'])
 def manual_exec():
@@ -367,13 +794,17 @@ def manual_exec():
         if play_url_on_ha(req['url'], song_name):
             system_status["current_track_title"] = song_name
             system_status["current_track_source"] = "Manual"
+            event_hub.publish("status")
             return jsonify({"success": True, "msg": "推送成功"})
         return jsonify({"success": False, "msg": "HA失败"})
     
     return jsonify(process_search_and_play(req.get('song_name'), req.get('sources', 'all')))
 
 @app.route('/api/clear_logs', methods=['POST'])
-def clear_logs(): return jsonify({"success": database.clear_all_logs()})
+def clear_logs():
+    success = database.clear_all_logs()
+    event_hub.publish("logs_reset")
+    return jsonify({"success": success})
 
 @app.route('/api/control/<action>', methods=['POST'])
 def media_control(action):
@@ -392,6 +823,26 @@ def media_control(action):
         play_current_queue_song()
         return jsonify({"success": True, "msg": "上一首"})
 
+    if action == "alternate":
+        # 当前版本不对或链接失效：换下一个候选结果，不重新搜索
+        if system_status["current_query"] and play_alternate(system_status["current_query"]):
+            return jsonify({"success": True, "msg": f"已切换: {system_status['current_track_title']}"})
+        return jsonify({"success": False, "msg": "没有可用的备选结果"})
+
+    if action == "mode":
+        # 切换随机/循环模式：{"shuffle": true, "repeat": "all|one|off"}
+        queue = system_status["queue"]
+        if not queue:
+            return jsonify({"success": False, "msg": "当前没有播放歌单"})
+        req = request.get_json(silent=True) or {}
+        if req.get('repeat') in REPEAT_MODES:
+            queue.repeat = req['repeat']
+        if 'shuffle' in req and bool(req['shuffle']) != queue.shuffle:
+            system_status["current_index"] = queue.set_shuffle(bool(req['shuffle']), system_status["current_index"])
+            schedule_prefetch()
+        event_hub.publish("status")
+        return jsonify({"success": True, "msg": "模式已更新", "data": queue.stats()})
+
     service_map = {
         "play_pause": "media_play_pause",
         "next": "media_next_track",
@@ -416,15 +867,63 @@ def rename_pl(name): return jsonify({"success": database.rename_playlist(name, r
 def get_songs(name): return jsonify(database.get_playlist_songs(name))
 @app.route('/api/playlists/<name>/songs', methods=['POST'])
 def add_song(name): return jsonify({"success": database.add_song_to_playlist(name, request.json.get('name'), "")[0]})
+@app.route('/api/playlists/<name>/import', methods=['POST'])
+def import_pl(name):
+    """批量导入：请求体为纯文本 (每行一首) / CSV / JSON 数组；先读完并解析，格式有误时一首都不写入"""
+    fmt = playlist_io.detect_format(request.args.get('format'), request.content_type)
+    try:
+        song_names = playlist_io.read_upload(request.stream, fmt)
+    except ValueError:
+        return jsonify({"success": False, "msg": "导入失败，请检查文件格式"})
+    success, result = database.add_songs_bulk(name, song_names) or (False, "导入失败")
+    if not success:
+        return jsonify({"success": False, "msg": result})
+    return jsonify({"success": True, "count": result})
+@app.route('/api/playlists/<name>/export', methods=['GET'])
+def export_pl(name):
+    if not database.is_playlist(name):
+        return jsonify({"success": False, "msg": "歌单不存在"}), 404
+    fmt = playlist_io.detect_format(request.args.get('format'))
+    exporter, mimetype, ext = playlist_io.EXPORTERS[fmt]
+    return Response(exporter(database.iter_playlist_songs(name)), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(name)}.{ext}"})
+@app.route('/api/playlists/<name>/resolve', methods=['POST'])
+def resolve_pl(name):
+    """后台预解析整个歌单；force=true 时忽略已有结果全部重新解析"""
+    if not database.is_playlist(name):
+        return jsonify({"success": False, "msg": "歌单不存在"}), 404
+    force = bool((request.get_json(silent=True) or {}).get('force'))
+    return jsonify({"success": True, "job": resolve_jobs.start(name, force).to_dict()})
+@app.route('/api/playlists/<name>/resolve', methods=['GET'])
+def resolve_pl_status(name):
+    job = resolve_jobs.get(name)
+    remaining = database.count_unresolved_songs(name, time.time() - RESOLVE_TTL)
+    return jsonify({"job": job.to_dict() if job else None, "remaining": remaining or 0})
+@app.route('/api/playlists/<name>/resolve', methods=['DELETE'])
+def cancel_resolve_pl(name): return jsonify({"success": resolve_jobs.cancel(name)})
 @app.route('/api/songs/<int:id>', methods=['DELETE'])
 def del_song(id): return jsonify({"success": database.remove_song_from_playlist(id)[0]})
 @app.route('/api/songs/<int:id>/rename', methods=['POST'])
 def rename_song(id):
     return jsonify({"success": database.rename_song_in_playlist(id, request.json.get('new_name'))[0]})
 
+def handle_sigterm(signum, frame):
+    """
+    docker stop 发送 SIGTERM；python 作为容器 PID 1 时没有默认处理，等到超时会被 SIGKILL，队列里的日志就丢了
+    这里先把日志写完再退出
+    """
+    print("🛑 收到 SIGTERM，写入剩余日志后退出")
+    log_writer.close()
+    sys.exit(0)
+
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, handle_sigterm)
     try: database.init_db()
     except: pass
+    if HA_WEBSOCKET: ha_stream.start()
     threading.Thread(target=background_monitor, daemon=True).start()
+    threading.Thread(target=prefetch_worker, daemon=True).start()
+    if LOG_RETENTION_ROWS or LOG_RETENTION_DAYS:
+        threading.Thread(target=retention_worker, daemon=True).start()
     print(f"🚀 音乐服务器启动 | 源: {MUSIC_SOURCE}")
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,109 @@
+"""
+时长探测基准：原来的 "下载前 128KB + mutagen" vs duration_probe 的 Range 请求 + 头部解析
+测试文件按固定参数生成 (CBR 带大 ID3 标签 / VBR 带 Xing 头 / moov 在末尾的 M4A)，本地限速服务模拟上游
+用法: python benchmarks/bench_duration_probe.py [--bandwidth 字节每秒] [--latency 秒] [--runs 次数]
+"""
+import io
+import os
+import sys
+import time
+import struct
+import argparse
+import tempfile
+import statistics
+
+import requests
+from mutagen.mp3 import MP3
+from mutagen.mp4 import MP4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import duration_probe
+from local_server import serve
+
+# MPEG1 Layer3 128kbps 44.1kHz 帧，每帧 417 字节、1152 个采样
+FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+FRAMES = 8000  # 约 209 秒
+
+
+def _synchsafe(n):
+    return bytes([(n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F])
+
+
+def _box(kind, body):
+    return struct.pack('>I', 8 + len(body)) + kind + body
+
+
+def generate_fixtures(directory):
+    """生成测试文件，返回 {文件名: 实际时长秒}"""
+    # 1. CBR + 200KB ID3 标签 (模拟内嵌封面)，音频起点超出首个 Range
+    tag = 200 * 1024
+    with open(os.path.join(directory, "cbr_cover.mp3"), 'wb') as f:
+        f.write(b'ID3\x03\x00\x00' + _synchsafe(tag) + b'\x00' * tag + FRAME * FRAMES)
+
+    # 2. VBR，首帧带 Xing 头记录总帧数
+    xing = bytearray(FRAME)
+    xing[4 + 32:4 + 32 + 12] = b'Xing' + struct.pack('>II', 1, FRAMES)
+    with open(os.path.join(directory, "vbr_xing.mp3"), 'wb') as f:
+        f.write(bytes(xing) + FRAME * FRAMES)
+
+    # 3. M4A，moov 在 mdat 之后 (未做 faststart)
+    mvhd = _box(b'mvhd', b'\x00\x00\x00\x00' + struct.pack('>IIII', 0, 0, 1000, 183500) + b'\x00' * 80)
+    with open(os.path.join(directory, "tail_moov.m4a"), 'wb') as f:
+        f.write(_box(b'ftyp', b'M4A \x00\x00\x00\x00') + _box(b'mdat', b'\x00' * (3 * 1024 * 1024)) + _box(b'moov', mvhd))
+
+    seconds = FRAMES * 1152 / 44100
+    return {"cbr_cover.mp3": seconds, "vbr_xing.mp3": seconds, "tail_moov.m4a": 183.5}
+
+
+def legacy_duration(url):
+    """原实现：整段流式下载前 128KB 交给 mutagen"""
+    resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, stream=True, timeout=5)
+    data = io.BytesIO()
+    for chunk in resp.iter_content(chunk_size=4096):
+        data.write(chunk)
+        if data.tell() > 128 * 1024: break
+    resp.close()
+    fetched = data.tell()
+    data.seek(0)
+    audio = None
+    try: audio = MP3(data)
+    except Exception:
+        try:
+            data.seek(0)
+            audio = MP4(data)
+        except Exception: pass
+    # 测试文件没有标签，mutagen 对象长度为 0，这里用 is not None 判断，只比较读取策略
+    seconds = audio.info.length if audio is not None and audio.info else 0
+    return seconds, fetched
+
+
+def measure(func, url, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        seconds, fetched = func(url)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), seconds, fetched
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bandwidth", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        expected = generate_fixtures(directory)
+        with serve(directory, bandwidth=args.bandwidth, latency=args.latency) as base:
+            print(f"带宽 {args.bandwidth / 1024:.0f} KB/s，往返延迟 {args.latency * 1000:.0f} ms，每项取 {args.runs} 次中位数\n")
+            print(f"{'文件':<16}{'实际时长':>8}  {'方法':<8}{'耗时(ms)':>10}{'读取(KB)':>10}{'结果(s)':>10}")
+            for name, actual in expected.items():
+                url = f"{base}/{name}"
+                for label, func in (("原实现", legacy_duration), ("Range", duration_probe.probe)):
+                    elapsed, seconds, fetched = measure(func, url, args.runs)
+                    print(f"{name:<16}{actual:>8.1f}  {label:<8}{elapsed:>10.1f}{fetched / 1024:>10.1f}{seconds:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
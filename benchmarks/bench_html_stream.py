@@ -0,0 +1,120 @@
+"""
+搜索页解析基准：原来的 "整页下载 + 解码 + re.search" vs html_stream 边下载边匹配、凑够结果即断开
+测试页面按固定参数生成，结构与 thttt / uq6 的搜索结果页一致：约 18KB 头部 (样式、脚本、导航)、60 条结果、约 24KB 页脚
+用法: python benchmarks/bench_html_stream.py [--bandwidth 字节每秒] [--latency 秒] [--runs 次数]
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import statistics
+
+import requests
+
+# music_apis 导入时会打开链接缓存库，指到临时目录，不在项目里留下 music_cache.db
+WORK_DIR = tempfile.mkdtemp()
+os.environ["URL_CACHE_DB"] = os.path.join(WORK_DIR, "cache.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from music_apis import thttt, uq6, html_stream
+from local_server import serve
+
+RESULTS = 60
+TITLE = "来自天堂的魔鬼"
+ARTIST = "G.E.M. 邓紫棋"
+
+
+def _song_id(driver, i, length):
+    return hashlib.md5(f"{driver}-{i}".encode()).hexdigest()[:length]
+
+
+def _page(items):
+    head = ("<!DOCTYPE html><html><head><meta charset='utf-8'><title>搜索</title>"
+            + "".join(f"<link rel='stylesheet' href='/style/css/{i}.css'>" for i in range(30))
+            + "<script>" + "var x=1;" * 1000 + "</script></head><body>"
+            + "<div class='nav'>导航菜单 热门歌曲 排行榜</div>" * 120)
+    footer = "<div class='footer'>" + "友情链接 版权所有 " * 1000 + "</div></body></html>"
+    return head + "<ul>" + "".join(items) + "</ul>" + footer
+
+
+def generate_fixtures(directory):
+    """生成 thttt.html / uq6.html"""
+    pages = {
+        "thttt": [f'<li><a href="/mp3/{_song_id("thttt", i, 32)}.html" class="url" target="_mp3">'
+                  f"{ARTIST} - <font color='red'>{TITLE}</font> 版本{i}</a><span>2024-01-01</span></li>\n"
+                  for i in range(RESULTS)],
+        "uq6": [f'<li><div class="name"><a href="http://www.6uq.cn/play/{_song_id("uq6", i, 16)}.html" target="_mp3">'
+                f"{ARTIST.replace(' ', '&nbsp;')}《{TITLE}》[MP3_LRC]{i}</a></div></li>\n"
+                for i in range(RESULTS)],
+    }
+    for name, items in pages.items():
+        with open(os.path.join(directory, f"{name}.html"), 'w', encoding='utf-8') as f:
+            f.write(_page(items))
+
+
+def legacy_first_match(session, url, pattern):
+    """原实现：读完整页再匹配"""
+    resp = session.get(url)
+    resp.encoding = 'utf-8'
+    return re.search(pattern.pattern, resp.text, re.IGNORECASE), len(resp.content)
+
+
+def stream_first_match(session, url, pattern):
+    resp = session.get(url, stream=True)
+    try:
+        match, fetched = html_stream.first_match(resp.iter_content(chunk_size=html_stream.CHUNK_SIZE), pattern)
+        return match, fetched
+    finally:
+        resp.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bandwidth", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--runs", type=int, default=40)
+    args = parser.parse_args()
+
+    try:
+        generate_fixtures(WORK_DIR)
+        with serve(WORK_DIR, bandwidth=args.bandwidth, latency=args.latency) as base:
+            print(f"带宽 {args.bandwidth / 1024:.0f} KB/s，往返延迟 {args.latency * 1000:.0f} ms，每项取 {args.runs} 次中位数\n")
+            for name, module in (("thttt", thttt), ("uq6", uq6)):
+                data = open(os.path.join(WORK_DIR, f"{name}.html"), 'rb').read()
+                expected = module.SEARCH_PATTERN.search(data.decode('utf-8'))
+
+                # 正确性：任意分块大小下都要得到与整页匹配相同的结果
+                for size in (1, 7, 64, 4096):
+                    match, _ = html_stream.first_match((data[i:i + size] for i in range(0, len(data), size)), module.SEARCH_PATTERN)
+                    assert match.groups() == expected.groups(), (name, size)
+
+                session = requests.Session()
+                row = [f"{name}: 页面 {len(data) / 1024:.0f} KB"]
+                for label, func in (("原实现", legacy_first_match), ("流式", stream_first_match)):
+                    timings = []
+                    for _ in range(args.runs):
+                        start = time.perf_counter()
+                        match, fetched = func(session, f"{base}/{name}.html", module.SEARCH_PATTERN)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    assert match.groups() == expected.groups(), (name, label)
+                    row.append(f"{label} {statistics.median(timings):.1f} ms / 读取 {fetched / 1024:.0f} KB")
+
+                # 纯 CPU：解码 + 匹配 (不含网络)
+                chunks = [data[i:i + html_stream.CHUNK_SIZE] for i in range(0, len(data), html_stream.CHUNK_SIZE)]
+                start = time.perf_counter()
+                for _ in range(1000): re.search(module.SEARCH_PATTERN.pattern, data.decode('utf-8'), re.IGNORECASE)
+                cpu_old = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                for _ in range(1000): html_stream.first_match(iter(chunks), module.SEARCH_PATTERN)
+                cpu_new = (time.perf_counter() - start) * 1000
+                row.append(f"解析 {cpu_old:.0f} -> {cpu_new:.0f} us")
+                print(" | ".join(row))
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+日志库微基准：原来的 "每次调用新建连接 + 默认 rollback journal" vs 连接池 + WAL
+分别测单线程 insert_log / fetch_logs 吞吐、LogWriter 用的 insert_logs 批量写入，以及 4 写 4 读并发混合
+两边各用一个临时库文件，先写入同样数量的历史日志
+用法: python benchmarks/bench_logs_db.py [--ops 次数] [--preload 历史条数]
+"""
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+
+# database 导入时就会初始化库文件，先指到临时目录，不碰项目里的 music_logs.db
+WORK_DIR = tempfile.mkdtemp()
+os.environ["MUSIC_DB_FILE"] = os.path.join(WORK_DIR, "pooled.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+
+class LegacyLogs:
+    """原实现：每次调用 sqlite3.connect，写完 commit 后关闭"""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        conn = self._connect()
+        conn.execute('''CREATE TABLE IF NOT EXISTS api_logs (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            timestamp TEXT,
+                            action_type TEXT,
+                            detail TEXT,
+                            status TEXT,
+                            api_response TEXT,
+                            duration_ms INTEGER DEFAULT 0
+                        )''')
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def insert_log(self, action_type, detail, status, api_response="", duration_ms=0):
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO api_logs (timestamp, action_type, detail, status, api_response, duration_ms) VALUES (?, ?, ?, ?, ?, ?)",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), action_type, detail, status, str(api_response)[:500], duration_ms))
+        conn.commit()
+        conn.close()
+        return True
+
+    def fetch_logs(self, limit=30):
+        conn = self._connect()
+        rows = conn.execute("SELECT * FROM api_logs WHERE action_type != '媒体控制' ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+
+def _entry(i):
+    return (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "获取链接", f"song{i} (源:qqmp3)", "成功", "http://example/x.mp3", 10)
+
+
+def _rate(count, func):
+    start = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - start)
+
+
+def run(label, insert_log, fetch_logs, insert_batch, ops):
+    single_insert = _rate(ops, lambda: [insert_log("获取链接", f"song{i} (源:qqmp3)", "成功", "http://example/x.mp3", 10) for i in range(ops)])
+    single_fetch = _rate(ops, lambda: [fetch_logs(30) for _ in range(ops)])
+    batch = _rate(ops, lambda: [insert_batch([_entry(i + j) for j in range(100)]) for i in range(0, ops, 100)]) if insert_batch else None
+
+    per_thread = ops // 8
+    def writer():
+        for i in range(per_thread): insert_log("获取链接", f"song{i} (源:qqmp3)", "成功")
+    def reader():
+        for _ in range(per_thread): fetch_logs(30)
+    threads = [threading.Thread(target=writer) for _ in range(4)] + [threading.Thread(target=reader) for _ in range(4)]
+    def mixed():
+        for t in threads: t.start()
+        for t in threads: t.join()
+    mixed_rate = _rate(per_thread * 8, mixed)
+
+    batch_text = f"{batch:>10.0f}" if batch else f"{'-':>10}"
+    print(f"{label:<10}{single_insert:>12.0f}{single_fetch:>12.0f}{batch_text}{mixed_rate:>14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--preload", type=int, default=10000)
+    args = parser.parse_args()
+
+    try:
+        legacy = LegacyLogs(os.path.join(WORK_DIR, "legacy.db"))
+        conn = legacy._connect()
+        conn.executemany("INSERT INTO api_logs (timestamp, action_type, detail, status, api_response, duration_ms) VALUES (?, ?, ?, ?, ?, ?)",
+                         [_entry(i) for i in range(args.preload)])
+        conn.commit()
+        conn.close()
+
+        database.insert_logs([_entry(i) for i in range(args.preload)])
+
+        print(f"每项 {args.ops} 次，库中已有 {args.preload} 条日志 (单位: 次/秒，批量写入为 条/秒)\n")
+        print(f"{'':<10}{'insert_log':>12}{'fetch_logs':>12}{'批量写入':>10}{'4写4读并发':>14}")
+        run("原实现", legacy.insert_log, legacy.fetch_logs, None, args.ops)
+        run("连接池+WAL", database.insert_log, database.fetch_logs, database.insert_logs, args.ops)
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import re
+import time
+import threading
+import http.server
+from contextlib import contextmanager
+
+
+class ThrottledHandler(http.server.BaseHTTPRequestHandler):
+    """
+    本地静态文件服务：支持 Range，按设定带宽分块发送，每个请求先等待 latency 秒模拟往返延迟
+    基准测试不访问外网，上游网络条件全部由这里模拟
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # 头和正文分开写，避免 Nagle + 延迟 ACK 给每个请求多加 40ms
+    directory = "."
+    bandwidth = 2 * 1024 * 1024  # 字节/秒
+    latency = 0.0
+    block = 4096
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = os.path.join(self.directory, self.path.split('?')[0].lstrip('/'))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        time.sleep(self.latency)
+
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Content-Type', 'text/html; charset=utf-8' if path.endswith('.html') else 'application/octet-stream')
+        self.end_headers()
+
+        delay = self.block / self.bandwidth
+        for i in range(0, len(body), self.block):
+            try:
+                self.wfile.write(body[i:i + self.block])
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端读够了主动断开
+                self.close_connection = True
+                return
+            time.sleep(delay)
+
+
+@contextmanager
+def serve(directory, bandwidth=ThrottledHandler.bandwidth, latency=0.0):
+    """在随机端口启动服务，返回 base url"""
+    handler = type("Handler", (ThrottledHandler,), {"directory": directory, "bandwidth": bandwidth, "latency": latency})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,18 +1,84 @@
 import sqlite3
+import time
 import os
 import sys
 import re
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 
 # === 核心配置 ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_FILE = os.path.join(BASE_DIR, "music_logs.db")
+DB_FILE = os.getenv("MUSIC_DB_FILE", os.path.join(BASE_DIR, "music_logs.db"))
+POOL_SIZE = 8  # 空闲连接最多保留几个
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_FILE)
+# === 连接池 ===
+# Flask 请求线程、监控线程、驱动线程池都会访问数据库，每次新建连接代价较高
+# 连接复用 + WAL 模式：读写互不阻塞，synchronous=NORMAL 减少 fsync
+_pool = []  # [(sqlite3.Connection, db_file)]
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+def _new_connection():
+    conn = sqlite3.connect(DB_FILE, timeout=5, check_same_thread=False)  # timeout 即 busy timeout
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-8000")  # 8MB 页缓存
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
+def _borrowed():
+    if not hasattr(_local, "borrowed"):
+        _local.borrowed = []
+    return _local.borrowed
+
+class PooledConnection:
+    """连接池中的连接：用法与 sqlite3.Connection 相同，close() 时归还连接池而不是真正关闭"""
+
+    def __init__(self, conn, db_file):
+        self._conn = conn
+        self._db_file = db_file
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._closed: return
+        self._closed = True
+        _release(self)
+
+def _release(pooled):
+    borrowed = _borrowed()
+    if pooled in borrowed: borrowed.remove(pooled)
+    raw = pooled._conn
+    try:
+        # 异常中断的写事务不能带回池里
+        if raw.in_transaction: raw.rollback()
+    except Exception:
+        raw.close()
+        return
+    with _pool_lock:
+        if len(_pool) < POOL_SIZE and pooled._db_file == DB_FILE:
+            _pool.append((raw, pooled._db_file))
+            return
+    raw.close()
+
+def get_db_connection():
+    raw = None
+    with _pool_lock:
+        while _pool:
+            conn, db_file = _pool.pop()
+            if db_file == DB_FILE:
+                raw = conn
+                break
+            conn.close()
+    if raw is None:
+        raw = _new_connection()
+    pooled = PooledConnection(raw, DB_FILE)
+    _borrowed().append(pooled)
+    return pooled
+
 def check_and_fix_schema(conn):
     """
     智能修复数据库结构：
@@ -20,6 +86,9 @@ def check_and_fix_schema(conn):
     2. 检查现有表是否缺少关键字段（自动迁移）
     """
     c = conn.cursor()
+    c.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    existing_tables = {row['name'] for row in c.fetchall()}
+    rebuild_stats = False
     
     # --- 定义表结构 ---
     tables = {
@@ -30,7 +99,21 @@ def check_and_fix_schema(conn):
                         detail TEXT,
                         status TEXT,
                         api_response TEXT,
-                        duration_ms INTEGER DEFAULT 0
+                        duration_ms INTEGER DEFAULT 0,
+                        source TEXT
+                    )''',
+        "source_stats": '''CREATE TABLE IF NOT EXISTS source_stats (
+                        source TEXT PRIMARY KEY,
+                        count INTEGER DEFAULT 0
+                    )''',
+        "log_rollups": '''CREATE TABLE IF NOT EXISTS log_rollups (
+                        day TEXT,
+                        source TEXT,
+                        action_type TEXT,
+                        status TEXT,
+                        count INTEGER DEFAULT 0,
+                        total_duration_ms INTEGER DEFAULT 0,
+                        PRIMARY KEY (day, source, action_type, status)
                     )''',
         "playlists": '''CREATE TABLE IF NOT EXISTS playlists (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -43,6 +126,12 @@ def check_and_fix_schema(conn):
                             name TEXT,
                             url TEXT,
                             added_at TEXT,
+                            source TEXT,
+                            source_id TEXT,
+                            duration INTEGER DEFAULT 0,
+                            resolved_at REAL DEFAULT 0,
+                            resolve_status TEXT,
+                            fail_count INTEGER DEFAULT 0,
                             FOREIGN KEY(playlist_id) REFERENCES playlists(id)
                         )'''
     }
@@ -58,14 +147,90 @@ def check_and_fix_schema(conn):
             if table_name == "api_logs" and "duration_ms" not in existing_columns:
                 c.execute("ALTER TABLE api_logs ADD COLUMN duration_ms INTEGER DEFAULT 0")
             
+            if table_name == "api_logs" and "source" not in existing_columns:
+                c.execute("ALTER TABLE api_logs ADD COLUMN source TEXT")
+                _backfill_log_sources(c)
+                rebuild_stats = True
+            
+            if table_name == "source_stats" and "source_stats" not in existing_tables:
+                rebuild_stats = True
+            
             if table_name == "playlist_songs" and "url" not in existing_columns:
                 c.execute("ALTER TABLE playlist_songs ADD COLUMN url TEXT")
+
+            # 预解析结果字段
+            if table_name == "playlist_songs":
+                for column, ddl in RESOLVE_COLUMNS:
+                    if column not in existing_columns:
+                        c.execute(f"ALTER TABLE playlist_songs ADD COLUMN {column} {ddl}")
                 
         except Exception as e:
             print(f"⚠️ 表 {table_name} 检查警告: {e}")
 
+    # --- 索引 ---
+    indexes = [
+        "CREATE INDEX IF NOT EXISTS idx_api_logs_source ON api_logs(source)",
+        "CREATE INDEX IF NOT EXISTS idx_api_logs_timestamp ON api_logs(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_playlist_songs_playlist ON playlist_songs(playlist_id, added_at)",
+    ]
+    for index_sql in indexes:
+        try:
+            c.execute(index_sql)
+        except Exception as e:
+            print(f"⚠️ 索引检查警告: {e}")
+
+    if c.execute("PRAGMA user_version").fetchone()[0] < STATS_VERSION:
+        rebuild_stats = True
+    if rebuild_stats:
+        _rebuild_source_stats(c)
+        c.execute(f"PRAGMA user_version = {STATS_VERSION}")
+
     conn.commit()
 
+# playlist_songs 预解析字段 (旧库自动补齐)
+RESOLVE_COLUMNS = [
+    ("source", "TEXT"),
+    ("source_id", "TEXT"),
+    ("duration", "INTEGER DEFAULT 0"),
+    ("resolved_at", "REAL DEFAULT 0"),
+    ("resolve_status", "TEXT"),
+    ("fail_count", "INTEGER DEFAULT 0"),
+]
+
+# 从 "歌名 (源:qqmp3)" 中提取源名称
+SOURCE_PATTERN = re.compile(r'\(源:(.*?)\)')
+# 计入成功播放统计的日志类型 (候选切换也是一次成功播放，算在实际出声的源上)
+PLAY_ACTIONS = ("获取链接", "歌单播放", "候选切换")
+# PLAY_ACTIONS 变化时加一，旧库启动时按新口径重建统计
+STATS_VERSION = 1
+
+def extract_source(detail):
+    match = SOURCE_PATTERN.search(detail or '')
+    return match.group(1) if match else None
+
+def _backfill_log_sources(c, batch_size=1000):
+    """迁移：给旧日志补上 source 字段，分批处理避免一次占用太多内存"""
+    last_id = 0
+    total = 0
+    while True:
+        c.execute("SELECT id, detail FROM api_logs WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+        rows = c.fetchall()
+        if not rows: break
+        last_id = rows[-1]['id']
+        updates = [(extract_source(row['detail']), row['id']) for row in rows]
+        c.executemany("UPDATE api_logs SET source = ? WHERE id = ?", [u for u in updates if u[0]])
+        total += len(rows)
+    if total:
+        print(f"🔧 [数据迁移] 已为 {total} 条日志补全 source 字段")
+
+def _rebuild_source_stats(c):
+    """根据现有日志重建各源成功次数"""
+    c.execute("DELETE FROM source_stats")
+    c.execute(f"""INSERT INTO source_stats (source, count)
+                  SELECT COALESCE(source, 'unknown'), COUNT(*) FROM api_logs
+                  WHERE action_type IN ({','.join('?' * len(PLAY_ACTIONS))}) AND status='成功'
+                  GROUP BY COALESCE(source, 'unknown')""", PLAY_ACTIONS)
+
 def init_db():
     try:
         conn = get_db_connection()
@@ -77,6 +242,7 @@ def init_db():
 # === 装饰器：自动修复与重试 ===
 def safe_db_execute(func):
     def wrapper(*args, **kwargs):
+        depth = len(_borrowed())
         try:
             return func(*args, **kwargs)
         except sqlite3.OperationalError as e:
@@ -90,32 +256,76 @@ def safe_db_execute(func):
             return False
         except Exception:
             return False
+        finally:
+            # 中途抛异常没走到 conn.close() 的连接，在这里回滚并归还连接池
+            for pooled in _borrowed()[depth:]:
+                pooled.close()
     return wrapper
 
 # === 日志功能 ===
 @safe_db_execute
 def insert_log(action_type, detail, status, api_response="", duration_ms=0):
-    conn = get_db_connection()
-    c = conn.cursor()
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    resp_str = str(api_response)[:500]
+    return insert_logs([(timestamp, action_type, detail, status, api_response, duration_ms)])
 
-    c.execute(
-        "INSERT INTO api_logs (timestamp, action_type, detail, status, api_response, duration_ms) VALUES (?, ?, ?, ?, ?, ?)",
-        (timestamp, action_type, detail, status, resp_str, duration_ms))
+@safe_db_execute
+def insert_logs(entries):
+    """
+    批量写日志，一个事务一次提交
+    entries: [(timestamp, action_type, detail, status, api_response, duration_ms), ...]
+    """
+    conn = get_db_connection()
+    rows = [(ts, action_type, detail, status, str(resp)[:500], duration_ms, extract_source(detail))
+            for ts, action_type, detail, status, resp, duration_ms in entries]
+    conn.executemany(
+        "INSERT INTO api_logs (timestamp, action_type, detail, status, api_response, duration_ms, source) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows)
+
+    # 同一事务内累加各源成功次数，统计接口不再扫描日志表
+    counts = {}
+    for row in rows:
+        if row[1] in PLAY_ACTIONS and row[3] == "成功":
+            source = row[6] or 'unknown'
+            counts[source] = counts.get(source, 0) + 1
+    if counts:
+        conn.executemany(
+            "INSERT INTO source_stats (source, count) VALUES (?, ?) "
+            "ON CONFLICT(source) DO UPDATE SET count = count + excluded.count",
+            list(counts.items()))
     conn.commit()
     conn.close()
 
-    if status not in ["成功", "自动忽略"]:
-        print(f"[{timestamp}] {action_type}: {detail} -> {status}")
+    for ts, action_type, detail, status, _, _, _ in rows:
+        if status not in ["成功", "自动忽略"]:
+            print(f"[{ts}] {action_type}: {detail} -> {status}")
     return True
 
 @safe_db_execute
-def fetch_logs(limit=30):
+def fetch_logs(limit=30, since_id=None, before_id=None, action_type=None, status=None):
+    """
+    分页读取日志 (新的在前)
+    since_id: 只取比它新的记录 (增量刷新)；before_id: 只取比它旧的记录 (向前翻页)
+    """
     conn = get_db_connection()
     c = conn.cursor()
     # 过滤媒体控制日志
-    c.execute("SELECT * FROM api_logs WHERE action_type != '媒体控制' ORDER BY id DESC LIMIT ?", (limit,))
+    where = ["action_type != '媒体控制'"]
+    params = []
+    if since_id:
+        where.append("id > ?")
+        params.append(since_id)
+    if before_id:
+        where.append("id < ?")
+        params.append(before_id)
+    if action_type:
+        where.append("action_type = ?")
+        params.append(action_type)
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    params.append(limit)
+    c.execute(f"SELECT * FROM api_logs WHERE {' AND '.join(where)} ORDER BY id DESC LIMIT ?", params)
     rows = c.fetchall()
     conn.close()
 
@@ -136,6 +346,8 @@ def fetch_logs(limit=30):
 def clear_all_logs():
     conn = get_db_connection()
     conn.execute("DELETE FROM api_logs")
+    conn.execute("DELETE FROM source_stats")
+    conn.execute("DELETE FROM log_rollups")
     conn.commit()
     conn.close()
     return True
@@ -143,31 +355,122 @@ def clear_all_logs():
 @safe_db_execute
 def get_source_stats():
     """
-    统计各源的成功播放次数
+    统计各源的成功播放次数 (单曲搜索"获取链接" + 歌单自动播放"歌单播放" + 链接失效后的"候选切换")
+    读取写入时增量维护的 source_stats 表，开销只与源的数量有关
     """
     conn = get_db_connection()
     c = conn.cursor()
-    
-    # 查找所有成功的播放记录，无论是单曲搜索("获取链接")还是歌单自动播放("歌单播放")
-    c.execute("SELECT detail FROM api_logs WHERE (action_type='获取链接' OR action_type='歌单播放') AND status='成功'")
-    
+    c.execute("SELECT source, count FROM source_stats WHERE count > 0")
     rows = c.fetchall()
     conn.close()
 
-    stats = {}
-    total = 0
-    for row in rows:
-        total += 1
-        # 提取 "歌名 (源:qqmp3)" 中的源名称
-        match = re.search(r'\(源:(.*?)\)', row['detail'])
-        if match:
-            source_name = match.group(1)
-            stats[source_name] = stats.get(source_name, 0) + 1
+    stats = {row['source']: row['count'] for row in rows}
+    return {"total": sum(stats.values()), "details": stats}
+
+# === 日志保留与按天汇总 ===
+@safe_db_execute
+def prune_logs(max_rows, max_days, batch_size=500):
+    """
+    删除最旧的一批超出保留范围 (行数或天数) 的日志，返回删除条数
+    删除前先按 天/源/类型/状态 累加到 log_rollups，长期统计不丢失
+    每次只处理一小批，由调用方循环，避免长时间占用写锁
+    """
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT MAX(id) AS max_id FROM api_logs")
+    max_id = c.fetchone()['max_id'] or 0
+    id_cutoff = max_id - max_rows if max_rows else 0
+    ts_cutoff = (datetime.now() - timedelta(days=max_days)).strftime("%Y-%m-%d %H:%M:%S") if max_days else ""
+
+    c.execute("SELECT id, timestamp, action_type, status, source, duration_ms FROM api_logs ORDER BY id LIMIT ?",
+              (batch_size,))
+    expired = []
+    for row in c.fetchall():
+        # id 与时间都随插入递增，遇到第一条仍在保留范围内的就停
+        if row['id'] <= id_cutoff or (row['timestamp'] or "") < ts_cutoff:
+            expired.append(row)
         else:
-            stats['unknown'] = stats.get('unknown', 0) + 1
-    return {"total": total, "details": stats}
+            break
+    if not expired:
+        conn.close()
+        return 0
+
+    rollups = {}
+    for row in expired:
+        key = ((row['timestamp'] or "")[:10], row['source'] or 'unknown', row['action_type'], row['status'])
+        count, total = rollups.get(key, (0, 0))
+        rollups[key] = (count + 1, total + (row['duration_ms'] or 0))
+    c.executemany(
+        "INSERT INTO log_rollups (day, source, action_type, status, count, total_duration_ms) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(day, source, action_type, status) DO UPDATE SET "
+        "count = count + excluded.count, total_duration_ms = total_duration_ms + excluded.total_duration_ms",
+        [key + value for key, value in rollups.items()])
+    c.execute("DELETE FROM api_logs WHERE id <= ?", (expired[-1]['id'],))
+    conn.commit()
+    conn.close()
+    return len(expired)
+
+@safe_db_execute
+def get_daily_stats(days=30):
+    """按天汇总：已归档的 log_rollups + 尚未清理的原始日志"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    c.execute("""SELECT day, source, action_type, status, SUM(count) AS count, SUM(total_duration_ms) AS total_ms
+                 FROM (
+                     SELECT day, source, action_type, status, count, total_duration_ms FROM log_rollups WHERE day >= ?
+                     UNION ALL
+                     SELECT substr(timestamp, 1, 10), COALESCE(source, 'unknown'), action_type, status, 1, duration_ms
+                     FROM api_logs WHERE timestamp >= ?
+                 )
+                 GROUP BY day, source, action_type, status
+                 ORDER BY day DESC""", (since, since))
+    rows = c.fetchall()
+    conn.close()
+    return [{
+        "day": row['day'],
+        "source": row['source'],
+        "type": row['action_type'],
+        "status": row['status'],
+        "count": row['count'],
+        "avg_duration": int((row['total_ms'] or 0) / row['count']) if row['count'] else 0
+    } for row in rows]
 
 # === 歌单管理 ===
+# 歌单名集合缓存：每次搜索都要判断"是不是歌单"，不必每次查库；创建/重命名/删除时失效
+_playlist_names = None
+_playlist_names_gen = 0  # 每次失效加一；加载期间被失效过的结果不写回缓存
+_playlist_names_lock = threading.Lock()
+
+def invalidate_playlist_names():
+    global _playlist_names, _playlist_names_gen
+    with _playlist_names_lock:
+        _playlist_names = None
+        _playlist_names_gen += 1
+
+@safe_db_execute
+def _load_playlist_names():
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT name FROM playlists")
+    names = {row['name'] for row in c.fetchall()}
+    conn.close()
+    return names
+
+def is_playlist(name):
+    global _playlist_names
+    with _playlist_names_lock:
+        names = _playlist_names
+        gen = _playlist_names_gen
+    if names is None:
+        names = _load_playlist_names()
+        if names is False: return False
+        with _playlist_names_lock:
+            # 读库期间有歌单增删改，这份结果可能是旧的，只用于本次判断
+            if _playlist_names_gen == gen:
+                _playlist_names = names
+    return name in names
+
 @safe_db_execute
 def create_playlist(name):
     try:
@@ -177,6 +480,7 @@ def create_playlist(name):
         c.execute("INSERT INTO playlists (name, created_at) VALUES (?, ?)", (name, ts))
         conn.commit()
         conn.close()
+        invalidate_playlist_names()
         return True, "创建成功"
     except sqlite3.IntegrityError:
         return False, "歌单名已存在"
@@ -188,6 +492,7 @@ def rename_playlist(old_name, new_name):
     c.execute("UPDATE playlists SET name = ? WHERE name = ?", (new_name, old_name))
     conn.commit()
     conn.close()
+    invalidate_playlist_names()
     return True, "重命名成功"
 
 @safe_db_execute
@@ -202,6 +507,7 @@ def delete_playlist(name):
         c.execute("DELETE FROM playlists WHERE id=?", (pid,))
         conn.commit()
         conn.close()
+        invalidate_playlist_names()
         return True, "删除成功"
     conn.close()
     return False, "歌单不存在"
@@ -225,6 +531,37 @@ def add_song_to_playlist(playlist_name, song_name, url=""):
     conn.close()
     return True, "添加成功"
 
+@safe_db_execute
+def add_songs_bulk(playlist_name, song_names, batch_size=500):
+    """
+    批量导入：按 batch_size 分批 executemany，整个导入只提交一次
+    迭代 song_names 期间一直持有写事务，上传内容应先读完 (playlist_io.read_upload) 再传进来
+    """
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT id FROM playlists WHERE name=?", (playlist_name,))
+    res = c.fetchone()
+    if not res:
+        conn.close()
+        return False, "歌单不存在"
+
+    pid = res['id']
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    total = 0
+    batch = []
+    for song_name in song_names:
+        batch.append((pid, song_name, "", ts))
+        if len(batch) >= batch_size:
+            c.executemany("INSERT INTO playlist_songs (playlist_id, name, url, added_at) VALUES (?, ?, ?, ?)", batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        c.executemany("INSERT INTO playlist_songs (playlist_id, name, url, added_at) VALUES (?, ?, ?, ?)", batch)
+        total += len(batch)
+    conn.commit()
+    conn.close()
+    return True, total
+
 @safe_db_execute
 def remove_song_from_playlist(song_id):
     conn = get_db_connection()
@@ -239,7 +576,9 @@ def rename_song_in_playlist(song_id, new_name):
     """重命名歌单中的歌曲"""
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute("UPDATE playlist_songs SET name = ? WHERE id = ?", (new_name, song_id))
+    # 改名后原来的解析结果不再对应，清空等待重新解析
+    c.execute("""UPDATE playlist_songs SET name = ?, url = '', source = NULL, source_id = NULL, duration = 0,
+                 resolved_at = 0, resolve_status = NULL, fail_count = 0 WHERE id = ?""", (new_name, song_id))
     conn.commit()
     conn.close()
     return True, "重命名成功"
@@ -248,17 +587,12 @@ def rename_song_in_playlist(song_id, new_name):
 def get_all_playlists():
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute("SELECT * FROM playlists ORDER BY created_at DESC")
-    rows = c.fetchall()
-    
-    playlists = []
-    for row in rows:
-        # 获取歌曲数量
-        c.execute("SELECT COUNT(*) as count FROM playlist_songs WHERE playlist_id=?", (row['id'],))
-        res = c.fetchone()
-        count = res['count'] if res else 0
-        playlists.append({"id": row['id'], "name": row['name'], "count": count})
-    
+    # 一次查询带出歌曲数量
+    c.execute("""SELECT p.id, p.name, COUNT(s.id) AS count
+                 FROM playlists p LEFT JOIN playlist_songs s ON s.playlist_id = p.id
+                 GROUP BY p.id
+                 ORDER BY p.created_at DESC""")
+    playlists = [{"id": row['id'], "name": row['name'], "count": row['count']} for row in c.fetchall()]
     conn.close()
     return playlists
 
@@ -266,18 +600,143 @@ def get_all_playlists():
 def get_playlist_songs(playlist_name):
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute("SELECT id FROM playlists WHERE name=?", (playlist_name,))
-    res = c.fetchone()
-    if not res: 
-        conn.close()
-        return []
-    
-    c.execute("SELECT * FROM playlist_songs WHERE playlist_id=? ORDER BY added_at ASC", (res['id'],))
-    songs = []
-    for row in c.fetchall():
-        songs.append({"id": row['id'], "name": row['name'], "url": row['url']})
+    c.execute("""SELECT s.* FROM playlist_songs s JOIN playlists p ON s.playlist_id = p.id
+                 WHERE p.name=? ORDER BY s.added_at ASC, s.id ASC""", (playlist_name,))
+    songs = [_song_row(row) for row in c.fetchall()]
+    conn.close()
+    return songs
+
+def _song_row(row):
+    return {
+        "id": row['id'], "name": row['name'], "url": row['url'],
+        "source": row['source'], "source_id": row['source_id'], "duration": row['duration'] or 0,
+        "resolved_at": row['resolved_at'] or 0, "resolve_status": row['resolve_status'],
+        "added_at": row['added_at']
+    }
+
+# === 歌单窗口读取 (播放队列按需加载) ===
+@safe_db_execute
+def get_playlist_info(playlist_name):
+    """返回 (playlist_id, 歌曲数量)，歌单不存在返回 (None, 0)"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("""SELECT p.id, (SELECT COUNT(*) FROM playlist_songs s WHERE s.playlist_id = p.id) AS count
+                 FROM playlists p WHERE p.name = ?""", (playlist_name,))
+    row = c.fetchone()
+    conn.close()
+    return (row['id'], row['count']) if row else (None, 0)
+
+@safe_db_execute
+def count_playlist_songs(playlist_id):
+    """按 id 取歌曲数量 (播放中歌单可能被改名)"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) FROM playlist_songs WHERE playlist_id = ?", (playlist_id,))
+    count = c.fetchone()[0]
+    conn.close()
+    return count
+
+@safe_db_execute
+def fetch_playlist_window(playlist_id, offset, limit, after=None):
+    """
+    按播放顺序 (added_at, id) 取 limit 首，走 (playlist_id, added_at) 索引
+    after 为上一个窗口最后一首的 (added_at, id)：从它之后接着读 (keyset)，不用像 OFFSET 那样先扫过前面的行
+    没有 after (第一次读取、跳转、随机播放) 时按 offset 定位
+    """
+    conn = get_db_connection()
+    c = conn.cursor()
+    if after:
+        # 拆成 "同一时间戳、id 更大" 和 "时间戳更大" 两段，两段都能直接在索引上定位 (索引隐含 rowid 列)
+        # 写成 added_at > ? OR id > ? 的话，批量导入的歌 added_at 都一样，只能从头扫
+        added_at, song_id = after
+        c.execute("""SELECT * FROM (SELECT * FROM playlist_songs WHERE playlist_id = ? AND added_at = ? AND id > ?
+                                    ORDER BY id ASC LIMIT ?)
+                     UNION ALL
+                     SELECT * FROM (SELECT * FROM playlist_songs WHERE playlist_id = ? AND added_at > ?
+                                    ORDER BY added_at ASC, id ASC LIMIT ?)
+                     LIMIT ?""", (playlist_id, added_at, song_id, limit, playlist_id, added_at, limit, limit))
+    else:
+        c.execute("""SELECT * FROM playlist_songs WHERE playlist_id = ?
+                     ORDER BY added_at ASC, id ASC LIMIT ? OFFSET ?""", (playlist_id, limit, offset))
+    songs = [_song_row(row) for row in c.fetchall()]
     conn.close()
     return songs
 
+# === 歌单预解析 ===
+_PENDING_SQL = """FROM playlist_songs s JOIN playlists p ON s.playlist_id = p.id
+                  WHERE p.name = ? AND (s.resolve_status IS NOT 'ok' OR s.resolved_at < ?)"""
+
+@safe_db_execute
+def count_unresolved_songs(playlist_name, stale_before):
+    """未解析、解析失败或结果过期的歌曲数量"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute(f"SELECT COUNT(*) {_PENDING_SQL}", (playlist_name, stale_before))
+    count = c.fetchone()[0]
+    conn.close()
+    return count
+
+@safe_db_execute
+def fetch_unresolved_songs(playlist_name, stale_before, after_id=0, limit=50):
+    """按 id 游标分页取待解析歌曲，中断后从头再取即可接着处理剩下的"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute(f"SELECT s.id, s.name {_PENDING_SQL} AND s.id > ? ORDER BY s.id LIMIT ?",
+              (playlist_name, stale_before, after_id, limit))
+    rows = [{"id": row['id'], "name": row['name']} for row in c.fetchall()]
+    conn.close()
+    return rows
+
+@safe_db_execute
+def save_song_resolutions(results):
+    """
+    批量回写解析结果，一次事务
+    results: [{"id", "success", "url", "source", "source_id", "duration"}]
+    失败只记次数和状态，保留上一次成功的链接
+    """
+    now = time.time()
+    ok_rows = [(r['url'], r['source'], str(r['source_id']), r['duration'] or 0, now, r['id'])
+               for r in results if r['success']]
+    failed_rows = [(now, r['id']) for r in results if not r['success']]
+    conn = get_db_connection()
+    c = conn.cursor()
+    if ok_rows:
+        c.executemany("""UPDATE playlist_songs SET url = ?, source = ?, source_id = ?, duration = ?, resolved_at = ?,
+                         resolve_status = 'ok', fail_count = 0 WHERE id = ?""", ok_rows)
+    if failed_rows:
+        c.executemany("""UPDATE playlist_songs SET resolved_at = ?, resolve_status = 'failed',
+                         fail_count = fail_count + 1 WHERE id = ?""", failed_rows)
+    conn.commit()
+    conn.close()
+    return True
+
+@safe_db_execute
+def mark_song_failed(song_id):
+    """播放时发现存储的链接不可用，标记后下次重新解析"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("UPDATE playlist_songs SET resolve_status = 'failed', fail_count = fail_count + 1 WHERE id = ?", (song_id,))
+    conn.commit()
+    conn.close()
+    return True
+
+def iter_playlist_songs(playlist_name, batch_size=500):
+    """
+    流式读取歌单歌曲 (导出用)，每次 fetchmany 一批，不把整个歌单读进内存
+    生成器不能用 safe_db_execute，连接在 finally 中归还
+    """
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute("""SELECT s.id, s.name, s.url, s.added_at FROM playlist_songs s JOIN playlists p ON s.playlist_id = p.id
+                     WHERE p.name=? ORDER BY s.added_at ASC, s.id ASC""", (playlist_name,))
+        while True:
+            rows = c.fetchmany(batch_size)
+            if not rows: break
+            for row in rows:
+                yield {"id": row['id'], "name": row['name'], "url": row['url'], "added_at": row['added_at']}
+    finally:
+        conn.close()
+
 # 启动自检
 init_db()
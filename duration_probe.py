@@ -0,0 +1,244 @@
+import io
+import re
+import struct
+import threading
+import requests
+from collections import OrderedDict
+
+from mutagen.flac import FLAC
+
+# === 探测配置 ===
+HEAD_SIZE = 16 * 1024   # 首次 Range 请求读取的字节数，足够覆盖常见的 ID3 + Xing 头
+CACHE_SIZE = 512
+TIMEOUT = 5
+
+session = requests.Session()
+session.headers.update({"User-Agent": "Mozilla/5.0"})
+
+# MPEG 音频帧头查表
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+
+class _Source:
+    """按需 Range 读取的远程文件，记录总长度"""
+
+    def __init__(self, url):
+        self.url = url
+        self.total = 0
+        self.ranged = False
+        self.fetched = 0
+
+    def read(self, start, length):
+        headers = {"Range": f"bytes={start}-{start + length - 1}"}
+        resp = session.get(self.url, headers=headers, stream=True, timeout=TIMEOUT)
+        try:
+            if resp.status_code == 206:
+                self.ranged = True
+                match = re.search(r'/(\d+)$', resp.headers.get('Content-Range', ''))
+                if match: self.total = int(match.group(1))
+            elif resp.status_code == 200:
+                # 服务器不支持 Range，只能从头读
+                if start > 0: return b''
+                self.total = int(resp.headers.get('Content-Length') or 0)
+            else:
+                return b''
+
+            data = io.BytesIO()
+            for chunk in resp.iter_content(chunk_size=4096):
+                data.write(chunk)
+                if data.tell() >= length: break
+            self.fetched += data.tell()
+            return data.getvalue()[:length]
+        finally:
+            resp.close()
+
+
+# === MP3 ===
+def _parse_frame_header(buf, pos):
+    if pos + 4 > len(buf) or buf[pos] != 0xFF or (buf[pos + 1] & 0xE0) != 0xE0: return None
+    b2, b3, b4 = buf[pos + 1], buf[pos + 2], buf[pos + 3]
+    version = {0: 25, 2: 2, 3: 1}.get((b2 >> 3) & 3)
+    layer = {1: 3, 2: 2, 3: 1}.get((b2 >> 1) & 3)
+    br_idx, sr_idx = (b3 >> 4) & 0xF, (b3 >> 2) & 3
+    if not version or not layer or br_idx in (0, 15) or sr_idx == 3: return None
+
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][br_idx] * 1000
+    sample_rate = _SAMPLE_RATES[version][sr_idx]
+    padding = (b3 >> 1) & 1
+    if layer == 1:
+        samples, frame_len = 384, (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 576 if (layer == 3 and version != 1) else 1152
+        frame_len = samples // 8 * bitrate // sample_rate + padding
+    return {
+        "version": version, "layer": layer, "bitrate": bitrate, "sample_rate": sample_rate,
+        "samples": samples, "frame_len": frame_len, "mono": (b4 >> 6) & 3 == 3
+    }
+
+
+def _find_first_frame(buf):
+    pos = 0
+    while True:
+        pos = buf.find(b'\xff', pos)
+        if pos < 0 or pos + 4 > len(buf): return None, None
+        header = _parse_frame_header(buf, pos)
+        if header:
+            # 校验下一帧，避免把数据里偶然出现的 0xFF 当成帧头
+            nxt = pos + header['frame_len']
+            if nxt + 4 > len(buf) or _parse_frame_header(buf, nxt):
+                return pos, header
+        pos += 1
+
+
+def _mp3_duration(buf, audio_start, total):
+    pos, header = _find_first_frame(buf)
+    if header is None: return 0
+
+    # Xing / Info 头 (VBR 帧数)
+    if header['version'] == 1:
+        side_info = 17 if header['mono'] else 32
+    else:
+        side_info = 9 if header['mono'] else 17
+    xing = pos + 4 + side_info
+    if buf[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', buf[xing + 4:xing + 8])[0]
+        if flags & 1:
+            frames = struct.unpack('>I', buf[xing + 8:xing + 12])[0]
+            return frames * header['samples'] / header['sample_rate']
+
+    # VBRI 头 (固定位于帧头后 32 字节)
+    vbri = pos + 36
+    if buf[vbri:vbri + 4] == b'VBRI':
+        frames = struct.unpack('>I', buf[vbri + 14:vbri + 18])[0]
+        return frames * header['samples'] / header['sample_rate']
+
+    # CBR：文件长度 / 码率
+    if total:
+        return (total - audio_start - pos) * 8 / header['bitrate']
+    return 0
+
+
+def _id3_size(buf):
+    if len(buf) < 10 or buf[:3] != b'ID3': return 0
+    size = 0
+    for b in buf[6:10]:
+        size = (size << 7) | (b & 0x7F)
+    footer = 10 if buf[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+# === MP4 ===
+def _box_header(buf, pos):
+    if pos + 8 > len(buf): return None
+    size, box_type = struct.unpack('>I4s', buf[pos:pos + 8])
+    header_len = 8
+    if size == 1:
+        if pos + 16 > len(buf): return None
+        size = struct.unpack('>Q', buf[pos + 8:pos + 16])[0]
+        header_len = 16
+    return size, box_type, header_len
+
+
+def _parse_mvhd(buf):
+    """在 moov 内容里找 mvhd，返回 duration / timescale"""
+    pos = 0
+    while True:
+        box = _box_header(buf, pos)
+        if not box: return 0
+        size, box_type, header_len = box
+        if box_type == b'mvhd':
+            body = buf[pos + header_len:]
+            if body[:1] == b'\x01':
+                timescale, duration = struct.unpack('>IQ', body[20:32])
+            else:
+                timescale, duration = struct.unpack('>II', body[12:20])
+            return duration / timescale if timescale else 0
+        if size < 8: return 0
+        pos += size
+
+
+def _mp4_duration(source, buf):
+    pos = 0
+    for _ in range(32):
+        if pos + 16 <= len(buf):
+            header_buf, base = buf, pos
+        else:
+            # 跳过 mdat 等大块数据，只读下一个 box 的头
+            header_buf, base = source.read(pos, 16), 0
+        box = _box_header(header_buf, base)
+        if not box: return 0
+        size, box_type, header_len = box
+        if box_type == b'moov':
+            body_start = pos + header_len
+            if body_start + 4096 <= len(buf):
+                body = buf[body_start:body_start + 4096]
+            else:
+                body = source.read(body_start, min(size - header_len, 4096))
+            return _parse_mvhd(body)
+        if size == 0 or (source.total and pos + size >= source.total): return 0
+        pos += size
+    return 0
+
+
+def probe(url):
+    """只读取文件头部元数据计算时长 (秒)，失败返回 0"""
+    source = _Source(url)
+    buf = source.read(0, HEAD_SIZE)
+    if not buf: return 0, source.fetched
+
+    if buf[4:8] == b'ftyp':
+        return _mp4_duration(source, buf), source.fetched
+
+    if buf[:4] == b'fLaC':
+        try: return FLAC(io.BytesIO(buf)).info.length, source.fetched
+        except Exception: return 0, source.fetched
+
+    audio_start = _id3_size(buf)
+    if audio_start:
+        # ID3 标签 (常带封面) 超出首段时，跳到音频起点再读
+        if audio_start + 1024 > len(buf):
+            buf = source.read(audio_start, 8192) if source.ranged else b''
+        else:
+            buf = buf[audio_start:]
+    return _mp3_duration(buf, audio_start, source.total), source.fetched
+
+
+# === 缓存：按 URL 和按歌曲两级 ===
+_lock = threading.Lock()
+_url_cache = OrderedDict()
+_song_cache = OrderedDict()
+
+
+def _remember(cache, key, value):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def get_duration(url, song_key=None):
+    """获取网络音频时长 (整数秒)，失败返回 0"""
+    with _lock:
+        for cache, key in ((_song_cache, song_key), (_url_cache, url)):
+            if key and key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+
+    try:
+        seconds, fetched = probe(url)
+    except Exception:
+        return 0
+    duration = int(seconds)
+    if duration > 0:
+        with _lock:
+            _remember(_url_cache, url, duration)
+            if song_key: _remember(_song_cache, song_key, duration)
+    return duration
@@ -0,0 +1,38 @@
+import threading
+
+
+class EventHub:
+    """
+    进程内变更通知：每个主题一个版本号，发布时递增并唤醒所有等待者
+    SSE 连接只在版本变化时才去取数据，空闲时不产生任何查询
+    """
+
+    def __init__(self, topics):
+        self.cond = threading.Condition()
+        self.versions = {topic: 0 for topic in topics}
+        self.subscribers = 0
+
+    def publish(self, topic):
+        with self.cond:
+            self.versions[topic] += 1
+            self.cond.notify_all()
+
+    def version(self, topic):
+        with self.cond:
+            return self.versions[topic]
+
+    def snapshot(self):
+        with self.cond:
+            return dict(self.versions)
+
+    def wait(self, seen, timeout):
+        """阻塞到任一主题版本不同于 seen 或超时，返回最新版本快照"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.versions != seen, timeout)
+            return dict(self.versions)
+
+    def subscribe(self):
+        with self.cond: self.subscribers += 1
+
+    def unsubscribe(self):
+        with self.cond: self.subscribers -= 1
@@ -0,0 +1,73 @@
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from music_apis.singleflight import SingleFlight
+
+
+class HAClient:
+    """
+    Home Assistant REST 客户端
+    复用同一个连接池 (keep-alive)；实体状态带短时缓存，并发读取合并为一次请求
+    监控线程和多个看板同时读取播放器状态时，HA 请求量不随看板数量增长
+    """
+
+    def __init__(self, ha_url, token, state_ttl=1.0, pool_size=8):
+        self.ha_url = ha_url.rstrip('/')
+        self.state_ttl = state_ttl
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.lock = threading.Lock()
+        self.cache = {}  # entity_id -> (fetched_at, state_json)
+        self.flight = SingleFlight()
+        self.requests = 0
+        self.cache_hits = 0
+
+    def call_service(self, domain, service, service_data, timeout=5):
+        with self.lock: self.requests += 1
+        try:
+            self.session.post(f"{self.ha_url}/api/services/{domain}/{service}", json=service_data, timeout=timeout)
+        except Exception:
+            return False
+        # 服务调用会改变实体状态，清掉对应缓存
+        entity_id = service_data.get('entity_id')
+        if entity_id: self.invalidate(entity_id)
+        return True
+
+    def _fetch_state(self, entity_id, timeout):
+        with self.lock: self.requests += 1
+        try:
+            response = self.session.get(f"{self.ha_url}/api/states/{entity_id}", timeout=timeout)
+            if response.status_code == 200:
+                data = response.json()
+                with self.lock:
+                    self.cache[entity_id] = (time.time(), data)
+                return data
+        except Exception:
+            pass
+        return None
+
+    def get_state(self, entity_id, timeout=5):
+        """返回实体状态 JSON，失败返回 None"""
+        with self.lock:
+            entry = self.cache.get(entity_id)
+            if entry and time.time() - entry[0] < self.state_ttl:
+                self.cache_hits += 1
+                return entry[1]
+        data, shared = self.flight.do(entity_id, self._fetch_state, entity_id, timeout)
+        return data
+
+    def invalidate(self, entity_id):
+        with self.lock:
+            self.cache.pop(entity_id, None)
+
+    def stats(self):
+        with self.lock:
+            result = {"requests": self.requests, "cache_hits": self.cache_hits}
+        result["coalesced"] = self.flight.stats()["coalesced"]
+        return result
@@ -0,0 +1,133 @@
+import json
+import time
+import threading
+
+try:
+    import websocket  # websocket-client
+except ImportError:
+    websocket = None
+
+IDLE_TIMEOUT = 60  # 多久没收到消息就发 ping (秒)
+PONG_TIMEOUT = 10  # ping 之后多久没回 pong 视为连接已死 (秒)
+
+
+class HAEventStream:
+    """
+    Home Assistant WebSocket 事件订阅
+    订阅 state_changed，在内存中维护关注实体的最新状态；断线自动重连并用 get_states 重新同步
+    未安装 websocket-client 或连接失败时 connected 为 False，调用方回退到 REST 轮询
+    """
+
+    def __init__(self, ha_url, token, entity_ids, on_change=None):
+        self.ws_url = ha_url.replace("https://", "wss://").replace("http://", "ws://").rstrip('/') + "/api/websocket"
+        self.token = token
+        self.entity_ids = {e for e in entity_ids if e}
+        self.on_change = on_change
+        self.states = {}  # entity_id -> {"state", "attributes", "last_updated"}
+        self.lock = threading.Lock()
+        self.connected = False
+        self.reconnects = 0
+        self.events = 0
+        self._msg_id = 0
+
+    def start(self):
+        if websocket is None:
+            print("⚠️ [HA事件] 未安装 websocket-client，使用轮询模式")
+            return False
+        threading.Thread(target=self._run, daemon=True).start()
+        return True
+
+    def get(self, entity_id):
+        """返回 (state, attributes)，没有数据时返回 (None, {})"""
+        with self.lock:
+            data = self.states.get(entity_id)
+        if not data: return None, {}
+        return data['state'], data['attributes']
+
+    # --- 内部实现 ---
+    def _send(self, ws, payload):
+        self._msg_id += 1
+        payload['id'] = self._msg_id
+        ws.send(json.dumps(payload))
+        return self._msg_id
+
+    def _update(self, entity_id, new_state):
+        if entity_id not in self.entity_ids: return
+        with self.lock:
+            if new_state:
+                self.states[entity_id] = {
+                    "state": new_state.get('state'),
+                    "attributes": new_state.get('attributes', {}),
+                    "last_updated": new_state.get('last_updated')
+                }
+            else:
+                self.states.pop(entity_id, None)
+        if self.on_change:
+            try: self.on_change(entity_id)
+            except Exception as e: print(f"Error in HA event handler: {e}")
+
+    def _session(self):
+        ws = websocket.create_connection(self.ws_url, timeout=10)
+        try:
+            # 1. 鉴权
+            msg = json.loads(ws.recv())
+            if msg.get('type') == 'auth_required':
+                ws.send(json.dumps({"type": "auth", "access_token": self.token}))
+                msg = json.loads(ws.recv())
+            if msg.get('type') != 'auth_ok':
+                raise RuntimeError(f"鉴权失败: {msg.get('message', msg.get('type'))}")
+
+            # 2. 先订阅再拉全量，避免两步之间漏掉变化
+            self._send(ws, {"type": "subscribe_events", "event_type": "state_changed"})
+            resync_id = self._send(ws, {"type": "get_states"})
+
+            ws.settimeout(IDLE_TIMEOUT)
+            self.connected = True
+            print("🔗 [HA事件] WebSocket 已连接，切换为事件驱动")
+            ping_id = None
+            while True:
+                try:
+                    raw = ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    # 半开连接 (HA 重启、网络中断) 收不到任何东西：ping 没回就断开重连，期间回退轮询
+                    if ping_id is not None:
+                        raise ConnectionError(f"{PONG_TIMEOUT}s 内未收到 pong")
+                    # 长时间没有事件，发个 ping 确认连接还活着
+                    ping_id = self._send(ws, {"type": "ping"})
+                    ws.settimeout(PONG_TIMEOUT)
+                    continue
+                if not raw:
+                    raise ConnectionError("服务端关闭连接")
+                msg = json.loads(raw)
+
+                if msg.get('type') == 'pong' and msg.get('id') == ping_id:
+                    ping_id = None
+                    ws.settimeout(IDLE_TIMEOUT)
+                elif msg.get('type') == 'event':
+                    data = msg.get('event', {}).get('data', {})
+                    self.events += 1
+                    self._update(data.get('entity_id'), data.get('new_state'))
+                elif msg.get('type') == 'result' and msg.get('id') == resync_id and msg.get('success'):
+                    for state in msg.get('result') or []:
+                        self._update(state.get('entity_id'), state)
+        finally:
+            self.connected = False
+            try: ws.close()
+            except Exception: pass
+
+    def _run(self):
+        backoff = 1
+        while True:
+            started = time.time()
+            try:
+                self._session()
+            except Exception as e:
+                print(f"⚠️ [HA事件] 连接断开: {e}，{backoff}s 后重连 (期间回退轮询)")
+            # 连接稳定过一段时间就重置退避
+            if time.time() - started > 60: backoff = 1
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+            self.reconnects += 1
+
+    def stats(self):
+        return {"connected": self.connected, "events": self.events, "reconnects": self.reconnects}
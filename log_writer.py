@@ -0,0 +1,94 @@
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+
+import database
+
+
+class LogWriter:
+    """
+    异步批量日志写入
+    record_action 只把日志放进有界队列就返回；后台线程攒批后 executemany 一次事务写入
+    队列满时：block 策略最多等待 block_timeout 秒，仍然满则丢弃并计数；drop 策略直接丢弃
+    """
+
+    def __init__(self, maxsize=1000, batch_size=100, max_delay=0.1, policy="block",
+                 block_timeout=0.05, on_flush=None):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.on_flush = on_flush
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self._stop = object()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, action_type, detail, status, api_response="", duration_ms=0):
+        entry = (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), action_type, detail, status,
+                 str(api_response)[:500], duration_ms)
+        try:
+            if self.policy == "block":
+                self.queue.put(entry, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _write(self, batch):
+        if not batch: return
+        if database.insert_logs(batch):
+            self.written += len(batch)
+        else:
+            self.dropped += len(batch)
+        self.batches += 1
+        if self.on_flush:
+            try: self.on_flush()
+            except Exception: pass
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is self._stop: return
+            batch = [item]
+            # 攒批：最多 batch_size 条或等待 max_delay 秒
+            deadline = time.time() + self.max_delay
+            stopping = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0: break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._stop:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stopping: return
+
+    def close(self, timeout=5):
+        """退出前把队列里剩余的日志写完"""
+        if not self._thread.is_alive(): return
+        try:
+            self.queue.put(self._stop, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "pending": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches
+        }
@@ -1,4 +1,6 @@
 import concurrent.futures
+import functools
+import os
 import time
 import sys
 
@@ -7,6 +9,24 @@ from . import gdstudio
 from . import thttt
 from . import uq6
 from . import qqmp3
+from .cache import url_cache, make_key
+from .catalog import source_catalog
+from .transport import transport
+from . import ratelimit
+from .candidates import candidate_store, CANDIDATES_PER_SOURCE
+from . import pool
+from . import scheduler
+from . import breaker
+from .singleflight import SingleFlight
+
+# === 搜索配置 ===
+SEARCH_BUDGET_MS = int(os.getenv("SEARCH_BUDGET_MS", "8000"))  # 单次搜索的时间预算，限流排队超过预算的源直接跳过
+
+# 所有目标源都在熔断时的返回信息，调用方据此停止重试
+BREAKER_OPEN_MSG = "所选音源暂时不可用 (熔断中)"
+
+# 相同歌名的并发搜索只跑一次竞速
+_inflight_searches = SingleFlight()
 
 # 注册所有可用驱动
 DRIVERS = {
@@ -16,23 +36,57 @@ DRIVERS = {
     "qqmp3": qqmp3
 }
 
-def _single_driver_task(driver_name, driver_module, song_name):
+def _search_candidates(driver_module, song_name):
+    """前 k 条搜索结果；只实现了 search 的驱动退化为 1 条"""
+    if hasattr(driver_module, "search_all"):
+        return driver_module.search_all(song_name, CANDIDATES_PER_SOURCE) or []
+    song_info = driver_module.search(song_name)
+    return [song_info] if song_info else []
+
+
+def _single_driver_task(driver_name, driver_module, song_name, cache_key=None):
     """单个驱动的工作线程"""
     start_time = time.time()
+    transport.reset_errors()
     try:
-        # 1. 搜索
-        song_info = driver_module.search(song_name)
-        if not song_info:
+        # 0. 目录里已有该源的歌曲 ID：跳过搜索直接取链接，失败再走完整流程
+        known = source_catalog.get(song_name, driver_name)
+        if known:
+            candidate_store.mark_tried(cache_key, driver_name, known['id'])
+            play_url = driver_module.get_play_url(known['id'])
+            if play_url:
+                known['source_label'] = driver_name
+                return {
+                    "success": True,
+                    "source": driver_name,
+                    "info": known,
+                    "url": play_url,
+                    "duration": int((time.time() - start_time) * 1000)
+                }
+            source_catalog.forget(song_name, driver_name)
+            pool.check_cancelled()
+
+        # 1. 搜索：保留前 k 条作为备选，落败被取消的源搜到的结果也会留下
+        results = _search_candidates(driver_module, song_name)
+        candidate_store.add(cache_key, driver_name, results)
+        if not results:
             return {
                 "success": False, 
+                "error": transport.had_errors(),
                 "source": driver_name, 
                 "msg": "搜索无结果",
                 "duration": int((time.time() - start_time) * 1000)
             }
 
-        # 2. 获取链接
+        # 竞速已结束则不再发起第二次请求
+        pool.check_cancelled()
+
+        # 2. 获取链接 (竞速中只取第一条，其余留给链接失效时切换)
+        song_info = dict(results[0])
+        candidate_store.mark_tried(cache_key, driver_name, song_info['id'])
         play_url = driver_module.get_play_url(song_info['id'])
         if play_url:
+            source_catalog.put(song_name, driver_name, song_info)
             song_info['source_label'] = driver_name
             return {
                 "success": True, 
@@ -44,26 +98,71 @@ def _single_driver_task(driver_name, driver_module, song_name):
         else:
             return {
                 "success": False, 
+                "error": transport.had_errors(),
                 "source": driver_name, 
                 "msg": "无法解析播放链接",
                 "duration": int((time.time() - start_time) * 1000)
             }
 
+    except pool.RaceCancelled as e:
+        # 竞速已结束：带上取消前的故障标记和耗时，落败源的熔断器据此记账
+        e.outcome = {"error": transport.had_errors(), "duration": int((time.time() - start_time) * 1000)}
+        raise
+
+    except ratelimit.RateLimited:
+        # 限流排不上队：跳过该源，不算作源的失败
+        return {
+            "success": False,
+            "skipped": True,
+            "source": driver_name,
+            "msg": "限流排队超出时间预算，已跳过",
+            "duration": int((time.time() - start_time) * 1000)
+        }
+
     except Exception as e:
         return {
             "success": False, 
+            "error": True,
             "source": driver_name, 
             "msg": f"程序异常: {str(e)}",
             "duration": int((time.time() - start_time) * 1000)
         }
 
 
-def search_and_get_url(song_name, source="all"):
+def _record_breaker(driver_name, success, error, duration_ms):
     """
-    并发搜索：竞速模式 (Race Mode)
-    一旦有一个源成功获取到 URL，立即返回，不再等待其他源。
+    只有异常 (连接失败、超时、5xx) 和慢调用计入熔断失败
+    没搜到 / 取不到链接说明源站响应正常，只归还试探权
     """
-    # 1. 确定目标驱动
+    if success or error or duration_ms >= breaker.SLOW_CALL_MS:
+        breaker.record(driver_name, success, duration_ms)
+    else:
+        breaker.release(driver_name)
+
+
+def _settle_loser(driver_name, future):
+    """
+    落败源的任务结束后按真实结果记入熔断器 (future 的 done 回调)
+    还没开始就被取消的只归还试探权；已经发出请求的，异常、5xx、慢调用照常计为失败
+    """
+    if future.cancelled():
+        breaker.release(driver_name)
+        return
+    exc = future.exception()
+    if exc is None:
+        res = future.result()
+        if res.get('skipped'): breaker.release(driver_name)
+        else: _record_breaker(driver_name, res['success'], res.get('error'), res['duration'])
+    elif isinstance(exc, pool.RaceCancelled):
+        outcome = getattr(exc, "outcome", None)
+        if outcome is None: breaker.release(driver_name)
+        else: _record_breaker(driver_name, False, outcome['error'], outcome['duration'])
+    else:
+        breaker.record(driver_name, False, 0)
+
+
+def _select_drivers(source):
+    """根据 source 参数确定目标驱动"""
     target_drivers = {}
     if not source or source == "all":
         target_drivers = DRIVERS
@@ -76,47 +175,209 @@ def search_and_get_url(song_name, source="all"):
     
     if not target_drivers:
         target_drivers = DRIVERS
+    return target_drivers
+
+
+def invalidate_cached_url(song_name, source="all"):
+    """链接失效时主动清除缓存，下次重新搜索"""
+    url_cache.invalidate(make_key(song_name, _select_drivers(source).keys()))
+
+
+def get_api_stats():
+    """音源层运行统计，供 /api/stats 展示"""
+    return {
+        "url_cache": url_cache.stats(),
+        "workers": pool.stats(),
+        "scheduler": scheduler.stats(),
+        "breakers": breaker.stats(),
+        "singleflight": _inflight_searches.stats(),
+        "catalog": source_catalog.stats(),
+        "transport": transport.stats(),
+        "rate_limits": ratelimit.stats(),
+        "candidates": candidate_store.stats()
+    }
 
-    # 打印极速搜索日志
-    source_list = list(target_drivers.keys())
-    print(f"🔥 [极速搜索] 目标源: {source_list} | 歌名: {song_name}")
+
+def search_and_get_url(song_name, source="all"):
+    """
+    并发搜索：竞速模式 (Race Mode)
+    一旦有一个源成功获取到 URL，立即返回，不再等待其他源。
+    已解析过的歌曲直接从缓存返回；同一首歌的并发请求合并为一次竞速。
+    """
+    # 1. 确定目标驱动
+    target_drivers = _select_drivers(source)
+
+    # 2. 查缓存
+    cache_key = make_key(song_name, target_drivers.keys())
+    cached = url_cache.get(cache_key)
+    if cached:
+        song_info, play_url = cached
+        print(f"⚡ [缓存命中] {song_info.get('source_label', 'unknown')} | 歌名: {song_name}")
+        return True, "成功", song_info, play_url, []
+
+    # 3. 合并并发请求：跟随者共享结果，异常日志只由发起者返回，避免重复写库
+    result, shared = _inflight_searches.do(cache_key, _race, song_name, target_drivers, cache_key)
+    if shared:
+        success, msg, song_info, play_url, error_logs = result
+        print(f"🤝 [合并请求] 共享进行中的搜索结果 | 歌名: {song_name}")
+        return success, msg, dict(song_info) if song_info else None, play_url, []
+    return result
+
+
+def next_candidate(song_name, source="all"):
+    """
+    当前链接不可用 (推送失败 / 播放不了 / 版本不对) 时切换到下一个候选
+    按排名直接对候选调用 get_play_url，不重新搜索；候选用尽返回失败，调用方再决定是否重新搜索
+    """
+    target_drivers = _select_drivers(source)
+    cache_key = make_key(song_name, target_drivers.keys())
+    url_cache.invalidate(cache_key)
+    for driver_name, song_info in candidate_store.untried(cache_key):
+        if driver_name not in target_drivers or not breaker.acquire(driver_name): continue
+        candidate_store.mark_tried(cache_key, driver_name, song_info['id'])
+        start_time = time.time()
+        transport.reset_errors()
+        error = False
+        try:
+            play_url = target_drivers[driver_name].get_play_url(song_info['id'])
+        except ratelimit.RateLimited:
+            breaker.release(driver_name)
+            continue
+        except Exception:
+            play_url, error = None, True
+        _record_breaker(driver_name, bool(play_url), error or transport.had_errors(), int((time.time() - start_time) * 1000))
+        if not play_url: continue
+
+        song_info['source_label'] = driver_name
+        url_cache.put(cache_key, song_info, play_url, driver_name)
+        source_catalog.put(song_name, driver_name, song_info)
+        candidate_store.record_fallback()
+        print(f"🔁 [候选切换] {driver_name} | {song_info.get('name')}")
+        return True, "成功", dict(song_info), play_url, []
+    return False, "没有可用的备选结果", None, None, []
+
+
+def refresh_play_url(driver_name, song_id):
+    """已知源和歌曲 ID (歌单预解析结果) 时直接取新链接，不搜索；取不到返回 None"""
+    driver_module = DRIVERS.get(driver_name)
+    if not driver_module or song_id in (None, "") or not breaker.acquire(driver_name): return None
+    start_time = time.time()
+    transport.reset_errors()
+    error = False
+    try:
+        play_url = driver_module.get_play_url(song_id)
+    except ratelimit.RateLimited:
+        breaker.release(driver_name)
+        return None
+    except Exception:
+        play_url, error = None, True
+    _record_breaker(driver_name, bool(play_url), error or transport.had_errors(), int((time.time() - start_time) * 1000))
+    return play_url
+
+
+def _race(song_name, target_drivers, cache_key):
+    """实际的竞速过程"""
+    # 按历史表现排序：对冲模式先发最优源，超时或失败再补发下一个
+    # 熔断中的源直接跳过，不占线程、不发请求、不写日志
+    ordered = scheduler.rank(breaker.filter_available(target_drivers))
+    if not ordered:
+        print(f"🔌 [搜索结束] 所选音源均处于熔断状态")
+        return False, BREAKER_OPEN_MSG, None, None, []
+    print(f"🔥 [极速搜索] 目标源: {ordered} | 歌名: {song_name}")
 
     error_logs = []
+    candidate_store.begin(cache_key, ordered)
     
-    # 不使用 'with'，允许立即返回而不阻塞
-    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(target_drivers) + 2)
-    
+    # 共享线程池 + 取消令牌：胜者产生后，落后的驱动不再发起后续请求
+    token = pool.CancelToken(deadline=time.time() + SEARCH_BUDGET_MS / 1000)
+    future_to_source = {}
+    pending = list(ordered)
+    running = set()
+
+    def launch(names):
+        """发起指定的源并移出 pending，返回最后发起的源"""
+        batch = []
+        for name in names:
+            pending.remove(name)
+            # 令牌桶预计排不到截止时间之前的源直接跳过，不占线程
+            if not ratelimit.admissible(name, token.deadline):
+                print(f"🚦 [限流] {name} 排队超出时间预算，跳过")
+                continue
+            if not breaker.acquire(name): continue
+            future = pool.submit(name, token, _single_driver_task, name, target_drivers[name], song_name, cache_key)
+            future_to_source[future] = name
+            running.add(future)
+            batch.append(name)
+        scheduler.record_launch(batch)
+        return batch[-1] if batch else None
+
+    def launch_next():
+        """按顺序补发下一个源，被限流或熔断跳过的继续往后找"""
+        while pending:
+            name = launch(pending[:1])
+            if name: return name
+        return None
+
     try:
-        # 提交所有任务
-        future_to_source = {
-            executor.submit(_single_driver_task, name, module, song_name): name
-            for name, module in target_drivers.items()
-        }
+        scheduler.record_query()
+        # 首批一个都没发出去 (限流或熔断跳过) 时按顺序补发
+        last_launched = launch(scheduler.first_wave(ordered)) or launch_next()
+
+        while running:
+            timeout = scheduler.hedge_delay(last_launched) if pending else None
+            done, _ = concurrent.futures.wait(running, timeout=timeout,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                # 对冲：当前源超过历史分位耗时仍未返回，追加下一个源
+                last_launched = launch_next() or last_launched
+                print(f"⏳ [对冲] 追加 {last_launched}")
+                continue
+
+            for future in done:
+                running.discard(future)
+                driver_name = future_to_source[future]
+                try:
+                    res = future.result()
+                    if res.get('skipped'):
+                        breaker.release(driver_name)
+                        error_logs.append({"source": driver_name, "msg": res['msg'], "duration": res['duration']})
+                        if pending and not running:
+                            last_launched = launch_next() or last_launched
+                        continue
+                    scheduler.record(driver_name, res['success'], res['duration'])
+                    _record_breaker(driver_name, res['success'], res.get('error'), res['duration'])
+                    if res['success']:
+                        # 🎯 命中：打印率先胜出日志
+                        print(f"🚀 [率先胜出] {driver_name} ({res['duration']}ms)")
+                        
+                        # 通知其他驱动退出，不等待它们
+                        token.cancel()
+                        for loser in running:
+                            scheduler.record_lost(future_to_source[loser])
+                            loser.add_done_callback(functools.partial(_settle_loser, future_to_source[loser]))
+                        url_cache.put(cache_key, res['info'], res['url'], driver_name)
+                        candidate_store.promote(cache_key, driver_name)
+                        
+                        return True, "成功", res['info'], res['url'], error_logs
+                    else:
+                        # 失败了记录日志，但不打印，保持控制台清爽
+                        error_logs.append({"source": driver_name, "msg": res['msg'], "duration": res['duration']})
+                
+                except Exception as exc:
+                    # print(f"❌ [{driver_name}] 线程崩溃: {exc}")
+                    scheduler.record(driver_name, False, 0)
+                    breaker.record(driver_name, False, 0)
+                    error_logs.append({"source": driver_name, "msg": f"CRASH: {str(exc)}", "duration": 0})
 
-        # 循环检查完成的任务
-        for future in concurrent.futures.as_completed(future_to_source):
-            driver_name = future_to_source[future]
-            try:
-                res = future.result()
-                if res['success']:
-                    # 🎯 命中：打印率先胜出日志
-                    print(f"🚀 [率先胜出] {driver_name} ({res['duration']}ms)")
-                    
-                    # 停止接收新任务，不等待其他任务
-                    executor.shutdown(wait=False)
-                    
-                    return True, "成功", res['info'], res['url'], error_logs
-                else:
-                    # 失败了记录日志，但不打印，保持控制台清爽
-                    error_logs.append({"source": driver_name, "msg": res['msg'], "duration": res['duration']})
-            
-            except Exception as exc:
-                # print(f"❌ [{driver_name}] 线程崩溃: {exc}")
-                error_logs.append({"source": driver_name, "msg": f"CRASH: {str(exc)}", "duration": 0})
+                # 失败立即补位，不必等对冲计时
+                if pending and not running:
+                    last_launched = launch_next() or last_launched
 
     finally:
-        # 确保最终关闭线程池资源
-        executor.shutdown(wait=False)
+        # 确保落后或排队中的任务全部收到取消信号
+        token.cancel()
+        for future in future_to_source:
+            future.cancel()
 
     # 如果循环结束还没有 return，说明所有源都失败了
     print(f"❌ [搜索结束] 所有源均未返回有效结果")
@@ -0,0 +1,116 @@
+import os
+import time
+import threading
+
+# === 熔断配置 ===
+FAILURE_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "5"))      # 连续失败多少次后熔断
+COOLDOWN = int(os.getenv("BREAKER_COOLDOWN", "60"))               # 熔断后多久允许一次试探 (秒)
+SLOW_CALL_MS = int(os.getenv("BREAKER_SLOW_MS", "8000"))          # 超过该耗时视为超时失败
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    单个源的熔断器
+    closed: 正常调用；open: 直接跳过；half_open: 只放行一个试探请求，成功则恢复
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.probe_inflight = False
+        self.skipped = 0
+
+    def _cooled_down(self):
+        return time.time() - self.opened_at >= COOLDOWN
+
+    def available(self):
+        if self.state == CLOSED: return True
+        return not self.probe_inflight and self._cooled_down()
+
+    def acquire(self):
+        """发起请求前调用；熔断中返回 False，半开状态只有第一个调用者拿到试探权"""
+        if self.state == CLOSED: return True
+        if self.available():
+            self.state = HALF_OPEN
+            self.probe_inflight = True
+            print(f"🔎 [熔断] {self.name} 冷却结束，发送试探请求")
+            return True
+        self.skipped += 1
+        return False
+
+    def release(self):
+        """请求被取消、没有结果时归还试探权"""
+        self.probe_inflight = False
+
+    def record(self, success, duration_ms):
+        self.probe_inflight = False
+        if success and duration_ms < SLOW_CALL_MS:
+            if self.state != CLOSED:
+                print(f"✅ [熔断] {self.name} 试探成功，恢复调用")
+            self.state = CLOSED
+            self.failures = 0
+            return
+
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= FAILURE_THRESHOLD:
+            if self.state == CLOSED:
+                print(f"🔌 [熔断] {self.name} 连续失败 {self.failures} 次，暂停 {COOLDOWN}s")
+            self.state = OPEN
+            self.opened_at = time.time()
+
+
+_lock = threading.Lock()
+_breakers = {}
+
+
+def _get(driver_name):
+    if driver_name not in _breakers:
+        _breakers[driver_name] = CircuitBreaker(driver_name)
+    return _breakers[driver_name]
+
+
+def filter_available(driver_names):
+    """过滤掉熔断中的源，并累计跳过次数"""
+    result = []
+    with _lock:
+        for name in driver_names:
+            b = _get(name)
+            if b.available():
+                result.append(name)
+            else:
+                b.skipped += 1
+    return result
+
+
+def acquire(driver_name):
+    with _lock:
+        return _get(driver_name).acquire()
+
+
+def release(driver_name):
+    with _lock:
+        _get(driver_name).release()
+
+
+def record(driver_name, success, duration_ms):
+    with _lock:
+        _get(driver_name).record(success, duration_ms)
+
+
+def stats():
+    with _lock:
+        return {
+            name: {
+                "state": b.state,
+                "failures": b.failures,
+                "skipped": b.skipped,
+                "retry_in": max(0, int(COOLDOWN - (time.time() - b.opened_at))) if b.state == OPEN else 0
+            }
+            for name, b in _breakers.items()
+        }
@@ -0,0 +1,252 @@
+import os
+import re
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# === 缓存配置 ===
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DB_FILE = os.getenv("URL_CACHE_DB", os.path.join(BASE_DIR, "music_cache.db"))
+CACHE_TTL = int(os.getenv("URL_CACHE_TTL", "1800"))        # 播放链接有效期 (秒)，CDN 链接通常带签名会过期
+CACHE_MAX_SIZE = int(os.getenv("URL_CACHE_SIZE", "500"))   # 内存中最多保留的条目数
+
+
+class CacheDbWriter:
+    """
+    缓存库的共用连接：链接缓存和 ID 目录共用一个库文件，只开一个 WAL 连接
+    读 (启动加载、目录未命中) 直接在锁内执行；写入只放进队列，后台线程攒批一次事务提交
+    解析链接的路径上不再有 connect / CREATE TABLE / commit 的开销
+    库文件在第一次读写时才打开，import music_apis 不会生成文件
+    """
+
+    def __init__(self, db_file, maxsize=1000, max_delay=0.2):
+        self.db_file = db_file
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.schemas = []  # 建表语句，打开连接时执行一次
+        self.conn = None
+        self.written = 0
+        self.dropped = 0
+        self._stop = object()
+        self._thread = None
+
+    def add_schema(self, sql):
+        with self.lock:
+            self.schemas.append(sql)
+            if self.conn is not None:
+                self.conn.execute(sql)
+                self.conn.commit()
+
+    def _connection(self):
+        """调用方需持有 self.lock"""
+        if self.conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for sql in self.schemas:
+                conn.execute(sql)
+            conn.commit()
+            self.conn = conn
+        return self.conn
+
+    def execute(self, sql, params=()):
+        """同步执行 (启动加载、目录查询)，返回全部结果行"""
+        with self.lock:
+            conn = self._connection()
+            rows = conn.execute(sql, params).fetchall()
+            conn.commit()
+            return rows
+
+    def submit(self, sql, params_list):
+        """异步写入，队列满时直接丢弃：缓存丢一条只是下次多查一次上游"""
+        if self._thread is None:
+            with self.lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+        try:
+            self.queue.put_nowait((sql, list(params_list)))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, batch):
+        try:
+            with self.lock:
+                conn = self._connection()
+                for sql, params_list in batch:
+                    conn.executemany(sql, params_list)
+                conn.commit()
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            print(f"⚠️ [缓存库] 写入失败: {e}")
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is self._stop: return
+            batch = [item]
+            deadline = time.time() + self.max_delay
+            stopping = False
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0: break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._stop:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stopping: return
+
+    def close(self, timeout=5):
+        """退出前把队列里剩余的写入提交"""
+        if self._thread is None or not self._thread.is_alive(): return
+        try:
+            self.queue.put(self._stop, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+
+_writers = {}  # db_file -> CacheDbWriter
+_writers_lock = threading.Lock()
+
+
+def get_writer(db_file):
+    """同一个库文件只建一个连接和写线程 (都在第一次用到时才创建)"""
+    with _writers_lock:
+        if db_file not in _writers:
+            _writers[db_file] = CacheDbWriter(db_file)
+        return _writers[db_file]
+
+
+def normalize_query(song_name):
+    """歌名归一化：去首尾空白、合并连续空白、统一小写"""
+    return re.sub(r'\s+', ' ', (song_name or '').strip()).lower()
+
+
+def make_key(song_name, source_keys):
+    """缓存键 = 选中的源 + 归一化歌名"""
+    return f"{','.join(sorted(source_keys))}|{normalize_query(song_name)}"
+
+
+class ResolvedUrlCache:
+    """
+    已解析链接缓存：内存 LRU + SQLite 持久化
+    命中只查内存字典；写入交给后台线程落盘，重启后自动恢复未过期的条目
+    """
+
+    def __init__(self, db_file=CACHE_DB_FILE, ttl=CACHE_TTL, max_size=CACHE_MAX_SIZE):
+        self.db_file = db_file
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (song_info, play_url, source, expires_at)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loaded = False
+        self.load_lock = threading.Lock()
+        self.db = get_writer(db_file)
+        self.db.add_schema('''CREATE TABLE IF NOT EXISTS url_cache (
+                                cache_key TEXT PRIMARY KEY,
+                                song_info TEXT,
+                                play_url TEXT,
+                                source TEXT,
+                                expires_at REAL
+                            )''')
+
+    # --- 持久化 ---
+    def _load(self):
+        """第一次读写时恢复未过期的条目"""
+        with self.load_lock:
+            if self.loaded: return
+            try:
+                self.db.execute("DELETE FROM url_cache WHERE expires_at <= ?", (time.time(),))
+                rows = self.db.execute(
+                    "SELECT cache_key, song_info, play_url, source, expires_at FROM url_cache "
+                    "ORDER BY expires_at DESC LIMIT ?", (self.max_size,))
+                with self.lock:
+                    # 越晚过期的越新，倒序插入让最新的位于 LRU 尾部
+                    for key, info, url, source, expires_at in reversed(rows):
+                        self.entries[key] = (json.loads(info), url, source, expires_at)
+                if rows:
+                    print(f"💾 [链接缓存] 已恢复 {len(rows)} 条缓存")
+            except Exception as e:
+                self.db = None
+                print(f"⚠️ [链接缓存] 加载失败: {e}")
+            self.loaded = True
+
+    def _persist(self, key, entry):
+        if self.db is None: return
+        song_info, play_url, source, expires_at = entry
+        self.db.submit("INSERT OR REPLACE INTO url_cache (cache_key, song_info, play_url, source, expires_at) "
+                       "VALUES (?, ?, ?, ?, ?)",
+                       [(key, json.dumps(song_info, ensure_ascii=False), play_url, source, expires_at)])
+
+    def _remove_persisted(self, keys):
+        if not keys or self.db is None: return
+        self.db.submit("DELETE FROM url_cache WHERE cache_key=?", [(k,) for k in keys])
+
+    # --- 读写接口 ---
+    def get(self, key):
+        """命中返回 (song_info, play_url)，未命中或已过期返回 None"""
+        if not self.loaded: self._load()
+        expired = False
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[3] > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[0]), entry[1]
+            if entry:
+                del self.entries[key]
+                expired = True
+            self.misses += 1
+        if expired:
+            self._remove_persisted([key])
+        return None
+
+    def put(self, key, song_info, play_url, source):
+        if not self.loaded: self._load()
+        entry = (dict(song_info), play_url, source, time.time() + self.ttl)
+        evicted = []
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                old_key, _ = self.entries.popitem(last=False)
+                evicted.append(old_key)
+                self.evictions += 1
+        self._persist(key, entry)
+        self._remove_persisted(evicted)
+
+    def invalidate(self, key):
+        if not self.loaded: self._load()
+        with self.lock:
+            self.entries.pop(key, None)
+        self._remove_persisted([key])
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0
+            }
+
+
+url_cache = ResolvedUrlCache()
@@ -0,0 +1,83 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# === 候选配置 ===
+CANDIDATES_PER_SOURCE = int(os.getenv("CANDIDATES_PER_SOURCE", "3"))  # 每个源保留前几条搜索结果
+CANDIDATE_TTL = int(os.getenv("CANDIDATE_TTL", "3600"))               # 候选集保留时间 (秒)
+MAX_TRACKS = 200                                                       # 最多保留多少首歌的候选集
+
+
+class CandidateStore:
+    """
+    每首歌的候选结果集：竞速中各源搜索到的前 k 条结果都记下来 (包括被取消的落败源已经搜到的)
+    当前链接不可用时，按排名直接对下一个候选取链接，不用重新跑一轮四源竞速
+    排名：先按结果在源内的名次，再按调度器给出的源顺序 (胜出源排最前)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> {"drivers", "rank", "tried", "at"}
+        self.fallbacks = 0
+
+    def begin(self, key, ranked_drivers):
+        """
+        新一轮竞速开始：更新源排名，保留未过期的候选和已试过的记录
+        目录命中的源跳过搜索、不会产生新候选，重置的话重复播放的歌就没有备选可切换了
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            now = time.time()
+            if entry is None or now - entry["at"] > CANDIDATE_TTL:
+                entry = {"drivers": {}, "tried": set()}
+                self.entries[key] = entry
+            entry["rank"] = list(ranked_drivers)
+            entry["at"] = now
+            self.entries.move_to_end(key)
+            while len(self.entries) > MAX_TRACKS:
+                self.entries.popitem(last=False)
+
+    def add(self, key, driver_name, results):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry["drivers"][driver_name] = [dict(r) for r in results]
+
+    def mark_tried(self, key, driver_name, song_id):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry["tried"].add((driver_name, str(song_id)))
+
+    def promote(self, key, driver_name):
+        """胜出源的其余结果优先作为备选"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and driver_name in entry["rank"]:
+                entry["rank"].remove(driver_name)
+                entry["rank"].insert(0, driver_name)
+
+    def untried(self, key):
+        """按排名返回还没试过的 [(driver_name, song_info)]"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry["at"] > CANDIDATE_TTL: return []
+            rank = {name: i for i, name in enumerate(entry["rank"])}
+            ranked = []
+            for driver_name, results in entry["drivers"].items():
+                for index, info in enumerate(results):
+                    if (driver_name, str(info.get('id'))) in entry["tried"]: continue
+                    ranked.append((index, rank.get(driver_name, len(rank)), driver_name, dict(info)))
+            ranked.sort(key=lambda item: (item[0], item[1]))
+            return [(driver_name, info) for _, _, driver_name, info in ranked]
+
+    def record_fallback(self):
+        with self.lock: self.fallbacks += 1
+
+    def stats(self):
+        with self.lock:
+            return {"tracks": len(self.entries), "fallbacks": self.fallbacks}
+
+
+candidate_store = CandidateStore()
@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from .cache import CACHE_DB_FILE, normalize_query, get_writer
+
+# === 目录配置 ===
+CATALOG_MEMORY_SIZE = int(os.getenv("SOURCE_CATALOG_SIZE", "2000"))  # 内存中最多保留的 (歌名, 源) 条目
+
+
+class SourceCatalog:
+    """
+    歌名 -> 各源歌曲 ID 的持久化目录 (qqmp3 的 rid、thttt/uq6 的 hash、gdstudio 的网易云 id)
+    同一首歌在源站的 ID 基本不变，播放链接才会过期；已知 ID 时跳过搜索直接取链接，上游请求减半
+    内存 LRU 缓存热门条目，未命中再查 SQLite (与链接缓存共用一个库文件和连接)，写入交给后台线程
+    """
+
+    def __init__(self, db_file=CACHE_DB_FILE, max_size=CATALOG_MEMORY_SIZE):
+        self.db_file = db_file
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (query, driver) -> song_info，None 表示库里也没有
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.db = get_writer(db_file)
+        self.db.add_schema('''CREATE TABLE IF NOT EXISTS source_catalog (
+                                query TEXT,
+                                driver TEXT,
+                                song_info TEXT,
+                                updated_at REAL,
+                                PRIMARY KEY (query, driver)
+                            )''')
+
+    def _remember(self, key, song_info):
+        self.entries[key] = song_info
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get(self, song_name, driver):
+        """返回该源上记录的 song_info (含 id)，没有返回 None"""
+        key = (normalize_query(song_name), driver)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                song_info = self.entries[key]
+                if song_info: self.hits += 1
+                else: self.misses += 1
+                return dict(song_info) if song_info else None
+
+        song_info = None
+        try:
+            rows = self.db.execute("SELECT song_info FROM source_catalog WHERE query=? AND driver=?", key)
+            if rows: song_info = json.loads(rows[0][0])
+        except Exception:
+            pass
+        with self.lock:
+            self._remember(key, song_info)
+            if song_info: self.hits += 1
+            else: self.misses += 1
+        return dict(song_info) if song_info else None
+
+    def put(self, song_name, driver, song_info):
+        if not song_info or song_info.get('id') in (None, ""): return
+        key = (normalize_query(song_name), driver)
+        song_info = {k: v for k, v in song_info.items() if k != 'source_label'}
+        with self.lock:
+            if self.entries.get(key) == song_info: return
+            self._remember(key, song_info)
+        self.db.submit("INSERT OR REPLACE INTO source_catalog (query, driver, song_info, updated_at) VALUES (?, ?, ?, ?)",
+                       [(key[0], driver, json.dumps(song_info, ensure_ascii=False), time.time())])
+
+    def forget(self, song_name, driver):
+        """记录的 ID 取不到链接了 (下架/换 ID)，删掉后回退搜索"""
+        key = (normalize_query(song_name), driver)
+        with self.lock:
+            self.entries[key] = None
+            self.stale += 1
+        self.db.submit("DELETE FROM source_catalog WHERE query=? AND driver=?", [key])
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "cached": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": round(self.hits / total, 3) if total else 0
+            }
+
+
+source_catalog = SourceCatalog()
@@ -1,50 +1,69 @@
-import requests
 import json
 import re
+import threading
 
-# 维持独立的 Session
-session = requests.Session()
-session.headers.update({
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+from .transport import transport
+
+# 走共享传输层，接口较慢，读超时稍长
+session = transport.client("gdstudio", headers={
     "Referer": "https://music-api.gdstudio.xyz/"
-})
+}, read_timeout=15)
 
 current_btwaf = "81051400"
+_btwaf_lock = threading.Lock()
 
 
-def smart_request(url, params):
+def _refresh_btwaf(used, challenge_text):
+    """
+    触发 WAF 校验后更新 btwaf
+    多个线程同时被拦时只有第一个真正更新，其余发现令牌已被换过就直接用新的重试
+    """
     global current_btwaf
-    params['btwaf'] = current_btwaf
+    with _btwaf_lock:
+        if current_btwaf != used:
+            return current_btwaf
+        match = re.search(r'btwaf=(\d+)', challenge_text)
+        if not match: return None
+        current_btwaf = match.group(1)
+        return current_btwaf
+
+
+def smart_request(url, params):
+    used = current_btwaf
+    params = dict(params, btwaf=used)
     try:
-        resp = session.get(url, params=params, timeout=15)  # 稍微增加超时时间
+        resp = session.get(url, params=params)
         try:
             return resp.json()
         except json.JSONDecodeError:
             pass
 
         if "btwaf=" in resp.text:
-            match = re.search(r'btwaf=(\d+)', resp.text)
-            if match:
-                new_btwaf = match.group(1)
-                current_btwaf = new_btwaf
+            new_btwaf = _refresh_btwaf(used, resp.text)
+            if new_btwaf:
                 params['btwaf'] = new_btwaf
-                return session.get(url, params=params, timeout=15).json()
+                return session.get(url, params=params).json()
         return None
     except Exception as e:
         print(f"⚠️ [gdstudio] 网络请求异常: {e}")
         return None
 
 
-def search(song_name):
+def search_all(song_name, limit=3):
     api_url = "https://music-api.gdstudio.xyz/api.php"
-    params = {"types": "search", "count": 1, "source": "netease", "pages": 1, "name": song_name}
+    params = {"types": "search", "count": limit, "source": "netease", "pages": 1, "name": song_name}
     res = smart_request(api_url, params)
     if res:
-        if isinstance(res, list) and res:
-            return res[0]
-        elif isinstance(res, dict) and 'list' in res and res['list']:
-            return res['list'][0]
-    return None
+        if isinstance(res, list):
+            return res[:limit]
+        elif isinstance(res, dict) and res.get('list'):
+            return res['list'][:limit]
+    return []
+
+
+def search(song_name):
+    results = search_all(song_name, 1)
+    return results[0] if results else None
 
 
 def get_play_url(song_id):
@@ -0,0 +1,60 @@
+import re
+import codecs
+
+from . import pool
+
+# === 流式 HTML 匹配 ===
+# 搜索结果页通常几十 KB，而第一条结果在页面前部；边下载边匹配，命中后立即断开，不再下载和解码剩余部分
+CHUNK_SIZE = 8192
+OVERLAP = 1024  # 跨块匹配：保留上一段末尾这么多字符，一条结果的 HTML 不会比这更长
+
+
+def first_matches(chunks, pattern, limit=1, overlap=OVERLAP, encoding='utf-8'):
+    """
+    在字节块序列上增量查找 pattern 的前 limit 个匹配，凑够就停止读取
+    返回 (matches, 已读取字节数)
+    """
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern, re.IGNORECASE)
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    matches = []
+    buf = ""
+    fetched = 0
+    for chunk in chunks:
+        # 竞速已结束则停止读取，fetch_matches 负责关闭连接
+        pool.check_cancelled()
+        if not chunk: continue
+        fetched += len(chunk)
+        buf += decoder.decode(chunk)
+        consumed = 0
+        for match in pattern.finditer(buf):
+            # 匹配到缓冲区末尾时可能还没完整 (非贪婪部分被截断)，等下一块再确认
+            if match.end() >= len(buf): break
+            matches.append(match)
+            consumed = match.end()
+            if len(matches) >= limit:
+                return matches, fetched
+        buf = buf[consumed:]
+        if len(buf) > overlap:
+            buf = buf[-overlap:]
+    buf += decoder.decode(b'', final=True)
+    for match in pattern.finditer(buf):
+        matches.append(match)
+        if len(matches) >= limit: break
+    return matches, fetched
+
+
+def first_match(chunks, pattern, overlap=OVERLAP, encoding='utf-8'):
+    """返回 (第一个匹配或 None, 已读取字节数)"""
+    matches, fetched = first_matches(chunks, pattern, 1, overlap, encoding)
+    return (matches[0] if matches else None), fetched
+
+
+def fetch_matches(session, url, pattern, limit=1, chunk_size=CHUNK_SIZE, **kwargs):
+    """GET url 并流式匹配，凑够 limit 条结果就关闭连接；返回匹配列表"""
+    resp = session.get(url, stream=True, **kwargs)
+    try:
+        matches, _ = first_matches(resp.iter_content(chunk_size=chunk_size), pattern, limit)
+        return matches
+    finally:
+        resp.close()
@@ -0,0 +1,105 @@
+import os
+import threading
+import concurrent.futures
+
+# === 线程池配置 ===
+POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "16"))                # 全局驱动线程上限
+MAX_INFLIGHT_PER_DRIVER = int(os.getenv("DRIVER_MAX_INFLIGHT", "4"))  # 单个驱动同时进行的请求上限
+
+
+class RaceCancelled(BaseException):
+    """
+    竞速已分出胜负，落后的驱动主动退出
+    继承 BaseException，避免被驱动内部的 except Exception 吞掉
+    """
+    pass
+
+
+class CancelToken:
+    """
+    协作式取消令牌：驱动在每个网络步骤之间检查，胜者产生后即停止后续请求
+    deadline 为本次搜索的截止时间戳，限流排队据此判断是否还值得等
+    """
+
+    def __init__(self, deadline=None):
+        self._event = threading.Event()
+        self.deadline = deadline
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def wait(self, timeout):
+        return self._event.wait(timeout)
+
+
+_local = threading.local()
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="music-driver")
+_slots = {}
+_stats_lock = threading.Lock()
+_active = 0
+_inflight = {}
+_cancelled = 0
+
+
+def current_token():
+    return getattr(_local, "token", None)
+
+
+def check_cancelled():
+    """驱动内部调用：当前竞速已取消则抛出 RaceCancelled"""
+    token = current_token()
+    if token and token.cancelled:
+        raise RaceCancelled()
+
+
+def _slot(driver_name):
+    with _stats_lock:
+        if driver_name not in _slots:
+            _slots[driver_name] = threading.BoundedSemaphore(MAX_INFLIGHT_PER_DRIVER)
+        return _slots[driver_name]
+
+
+def _run(driver_name, token, fn, args):
+    global _active, _cancelled
+    slot = _slot(driver_name)
+    # 等待驱动空位，期间竞速结束则直接放弃
+    while not slot.acquire(timeout=0.2):
+        if token.cancelled:
+            with _stats_lock: _cancelled += 1
+            raise RaceCancelled()
+
+    with _stats_lock:
+        _active += 1
+        _inflight[driver_name] = _inflight.get(driver_name, 0) + 1
+    _local.token = token
+    try:
+        if token.cancelled: raise RaceCancelled()
+        return fn(*args)
+    except RaceCancelled:
+        with _stats_lock: _cancelled += 1
+        raise
+    finally:
+        _local.token = None
+        with _stats_lock:
+            _active -= 1
+            _inflight[driver_name] -= 1
+        slot.release()
+
+
+def submit(driver_name, token, fn, *args):
+    """向共享线程池提交驱动任务"""
+    return _executor.submit(_run, driver_name, token, fn, args)
+
+
+def stats():
+    with _stats_lock:
+        return {
+            "pool_size": POOL_SIZE,
+            "active_workers": _active,
+            "inflight": {k: v for k, v in _inflight.items() if v},
+            "cancelled": _cancelled
+        }
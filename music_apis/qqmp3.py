@@ -1,6 +1,7 @@
-import requests
 from urllib.parse import quote
 
+from .transport import transport
+
 # 定义通用请求头
 # 虽然你说只要Host，但为了稳定性，加上 User-Agent 是标准操作
 HEADERS = {
@@ -8,10 +9,13 @@ HEADERS = {
     # requests 会自动处理 Host，通常不需要手动写
 }
 
+# 走共享传输层，复用 keep-alive 连接
+session = transport.client("qqmp3", headers=HEADERS)
 
-def search(song_name):
+
+def search_all(song_name, limit=3):
     """
-    搜索逻辑
+    搜索逻辑，返回前 limit 条结果
     URL: https://api.qqmp3.vip/api/songs.php?type=search&keyword={歌名}
     """
     try:
@@ -20,26 +24,29 @@ def search(song_name):
         url = f"https://api.qqmp3.vip/api/songs.php?type=search&keyword={keyword}"
 
         # 2. 发送请求
-        resp = requests.get(url, headers=HEADERS, timeout=10)
+        resp = session.get(url)
         data = resp.json()
 
         # 3. 解析数据
-        # 结构: data['data'][0] -> rid, name, artist
+        # 结构: data['data'][i] -> rid, name, artist
         if data.get('code') == 200 and data.get('data'):
-            first_song = data['data'][0]
-
-            return {
-                "id": first_song.get('rid'),  # 获取 rid (例如 564)
-                "name": first_song.get('name'),  # 获取歌名
-                "artist": first_song.get('artist'),  # 获取歌手
+            return [{
+                "id": song.get('rid'),  # 获取 rid (例如 564)
+                "name": song.get('name'),  # 获取歌名
+                "artist": song.get('artist'),  # 获取歌手
                 "source": "qqmp3"
-            }
+            } for song in data['data'][:limit]]
 
-        return None
+        return []
 
     except Exception as e:
         print(f"⚠️ [qqmp3] 搜索报错: {e}")
-        return None
+        return []
+
+
+def search(song_name):
+    results = search_all(song_name, 1)
+    return results[0] if results else None
 
 
 def get_play_url(song_id):
@@ -52,7 +59,7 @@ def get_play_url(song_id):
         url = f"https://api.qqmp3.vip/api/kw.php?rid={song_id}&type=json&level=exhigh&lrc=true"
 
         # 发送请求
-        resp = requests.get(url, headers=HEADERS, timeout=10)
+        resp = session.get(url)
         data = resp.json()
 
         # 解析数据
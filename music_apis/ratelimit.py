@@ -0,0 +1,123 @@
+import os
+import time
+import threading
+
+from . import pool
+
+# === 限流配置 ===
+# 格式: "驱动=每秒请求数:突发容量,..."，未配置的驱动不限流；gdstudio 在 WAF 后面，突发请求容易触发 btwaf 校验
+RATE_LIMITS = os.getenv("DRIVER_RATE_LIMITS", "gdstudio=2:4")
+MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "5"))  # 没有截止时间的调用最多排队多久 (秒)
+
+
+class RateLimited(BaseException):
+    """
+    截止时间前拿不到令牌，放弃这个源
+    与 RaceCancelled 一样继承 BaseException，不会被驱动内部的 except Exception 吞掉，也不计入失败
+    """
+    pass
+
+
+class TokenBucket:
+    """
+    令牌桶 + 预约式排队
+    每个请求先预约一个令牌 (令牌数可以暂时为负，代表排在前面的请求)，按预约顺序等待，天然先来先服务
+    预计等待超过调用方截止时间的请求直接拒绝，不进入队列
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.time()
+        self.lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = 0
+        self.waiting = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def estimate(self):
+        """现在预约需要等待多久 (秒)"""
+        with self.lock:
+            self._refill(time.time())
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def acquire(self, deadline=None, cancel_token=None):
+        now = time.time()
+        with self.lock:
+            self._refill(now)
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            limit = deadline if deadline is not None else now + MAX_WAIT
+            if now + wait > limit:
+                self.rejected += 1
+                return False
+            self.tokens -= 1
+            self.admitted += 1
+            self.waiting += 1
+        try:
+            if wait <= 0: return True
+            # 排队期间竞速结束，归还预约
+            if cancel_token and cancel_token.wait(wait):
+                with self.lock: self.tokens += 1
+                raise pool.RaceCancelled()
+            if not cancel_token: time.sleep(wait)
+            return True
+        finally:
+            with self.lock: self.waiting -= 1
+
+    def stats(self):
+        with self.lock:
+            self._refill(time.time())
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "tokens": round(self.tokens, 2),
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected
+            }
+
+
+def _parse(spec):
+    buckets = {}
+    for item in (spec or "").split(','):
+        if '=' not in item: continue
+        name, _, value = item.partition('=')
+        rate, _, burst = value.partition(':')
+        try:
+            rate = float(rate)
+            burst = float(burst) if burst else max(1.0, rate)
+        except ValueError:
+            print(f"⚠️ [限流] 配置无法解析: {item}")
+            continue
+        if rate > 0:
+            buckets[name.strip()] = TokenBucket(rate, burst)
+    return buckets
+
+
+_buckets = _parse(RATE_LIMITS)
+
+
+def admissible(driver_name, deadline):
+    """发起前预判：按当前排队情况能否在截止时间前拿到令牌"""
+    bucket = _buckets.get(driver_name)
+    if not bucket or deadline is None: return True
+    if time.time() + bucket.estimate() <= deadline: return True
+    with bucket.lock: bucket.rejected += 1
+    return False
+
+
+def admit(driver_name):
+    """驱动每次发请求前调用：排队拿令牌，截止时间 (来自当前竞速) 前拿不到则抛 RateLimited"""
+    bucket = _buckets.get(driver_name)
+    if not bucket: return
+    token = pool.current_token()
+    if not bucket.acquire(token.deadline if token else None, token):
+        raise RateLimited()
+
+
+def stats():
+    return {name: bucket.stats() for name, bucket in _buckets.items()}
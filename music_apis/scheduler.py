@@ -0,0 +1,134 @@
+import os
+import random
+import threading
+from collections import deque
+
+# === 调度配置 ===
+SCHEDULE_MODE = os.getenv("DRIVER_SCHEDULE", "hedge")            # hedge: 择优+对冲 | all: 全部同时发起
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9"))   # 超过该分位耗时仍未返回，才启动下一个源
+HEDGE_DEFAULT_MS = int(os.getenv("HEDGE_DEFAULT_MS", "1500"))    # 没有历史数据时的对冲等待
+HEDGE_MIN_MS = 300
+HEDGE_MAX_MS = 5000
+EXPLORE_RATE = 0.05   # 偶尔打乱顺序，让冷门源也能积累统计
+WINDOW = 50           # 每个源保留最近多少次结果
+WARMUP_LAUNCHES = 3   # 发起次数不足的源随首批一起发出，尽快积累统计
+
+
+class DriverStats:
+    """单个源的滚动统计：最近的成功耗时 + 胜出率 (成功且未被更快的源抢先)"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=WINDOW)
+        self.outcomes = deque(maxlen=WINDOW)
+        self.launches = 0
+
+    def record(self, success, duration_ms):
+        self.outcomes.append(bool(success))
+        if success:
+            self.latencies.append(duration_ms)
+
+    def record_lost(self):
+        """落败被取消的源：不知道它最终能否成功，只记为一次未胜出"""
+        self.outcomes.append(False)
+
+    def percentile(self, p):
+        if not self.latencies: return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+    def win_rate(self):
+        if not self.outcomes: return None
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def score(self):
+        """期望的出链时间，越小越好；无数据的源按默认值对待"""
+        p50 = self.percentile(0.5)
+        rate = self.win_rate()
+        if p50 is None: p50 = HEDGE_DEFAULT_MS
+        if rate is None: rate = 1.0
+        return p50 / max(rate, 0.05)
+
+
+_lock = threading.Lock()
+_stats = {}
+_queries = 0
+_launched = 0
+
+
+def _get(driver_name):
+    if driver_name not in _stats:
+        _stats[driver_name] = DriverStats()
+    return _stats[driver_name]
+
+
+def record(driver_name, success, duration_ms):
+    with _lock:
+        _get(driver_name).record(success, duration_ms)
+
+
+def record_lost(driver_name):
+    with _lock:
+        _get(driver_name).record_lost()
+
+
+def record_query():
+    global _queries
+    with _lock:
+        _queries += 1
+
+
+def record_launch(driver_names):
+    global _launched
+    with _lock:
+        _launched += len(driver_names)
+        for name in driver_names:
+            _get(name).launches += 1
+
+
+def first_wave(ordered):
+    """首批发起的源：对冲模式为最优源 + 尚在预热期的源，其余已知源留给对冲补发"""
+    if SCHEDULE_MODE == "all": return list(ordered)
+    if not ordered: return []
+    with _lock:
+        cold = {name for name in ordered[1:] if _get(name).launches < WARMUP_LAUNCHES}
+    return [ordered[0]] + [name for name in ordered[1:] if name in cold]
+
+
+def rank(driver_names):
+    """按历史表现排序，最优的源排在最前"""
+    names = list(driver_names)
+    if random.random() < EXPLORE_RATE:
+        random.shuffle(names)
+        return names
+    with _lock:
+        scores = {name: _get(name).score() for name in names}
+        cold = {name for name in names if _get(name).launches < WARMUP_LAUNCHES}
+    # 预热中的源排在已知源之后，随首批一起发出
+    return sorted(names, key=lambda n: (n in cold, scores[n]))
+
+
+def hedge_delay(driver_name):
+    """该源超过此时间 (秒) 未返回，即启动下一个源"""
+    with _lock:
+        value = _get(driver_name).percentile(HEDGE_PERCENTILE)
+    if value is None: value = HEDGE_DEFAULT_MS
+    return min(max(value, HEDGE_MIN_MS), HEDGE_MAX_MS) / 1000
+
+
+def stats():
+    with _lock:
+        details = {}
+        for name, s in _stats.items():
+            rate = s.win_rate()
+            details[name] = {
+                "samples": len(s.outcomes),
+                "win_rate": round(rate, 3) if rate is not None else None,
+                "p50_ms": s.percentile(0.5),
+                "p90_ms": s.percentile(0.9)
+            }
+        return {
+            "mode": SCHEDULE_MODE,
+            "queries": _queries,
+            "requests_per_query": round(_launched / _queries, 2) if _queries else 0,
+            "drivers": details
+        }
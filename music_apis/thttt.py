@@ -1,11 +1,11 @@
-import requests
 import re
 from urllib.parse import quote
 
-# 创建 Session 保持连接
-session = requests.Session()
-session.headers.update({
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+from .html_stream import fetch_matches
+from .transport import transport
+
+# 走共享传输层 (连接池复用)，这里只带本站的请求头
+session = transport.client("thttt", headers={
     "Host": "www.thttt.com",
     "Referer": "http://www.thttt.com/",
     "Origin": "http://www.thttt.com"
@@ -13,43 +13,44 @@ session.headers.update({
 
 BASE_URL = "http://www.thttt.com"
 
+# 搜索结果链接
+# 例子: <a href="/mp3/14261b97130ea1ced8d12a890bd1cb1a.html" class="url" target="_mp3">G.E.M. 邓紫棋 - <font color='red'>来自天堂的魔鬼</font></a>
+# 捕获组 1: ID
+# 捕获组 2: 歌名 (含HTML标签)
+SEARCH_PATTERN = re.compile(r'href="/mp3/([a-f0-9]+)\.html"[^>]*>(.*?)</a>', re.IGNORECASE)
 
-def search(song_name):
+
+def search_all(song_name, limit=3):
     """
-    搜索歌曲，解析 HTML 提取歌曲 ID
+    搜索歌曲，解析 HTML 提取前 limit 条结果的 ID
     目标格式: <a href="/mp3/{id}.html" ...>...</a>
     """
     try:
-        # 1. 发起搜索请求
+        # 1. 发起搜索请求，边下载边匹配，凑够 limit 条就断开 (网页是 UTF-8)
         search_url = f"{BASE_URL}/so.php?wd={quote(song_name)}"
-        resp = session.get(search_url, timeout=15)
-        resp.encoding = 'utf-8'  # 网页是 UTF-8
-        html = resp.text
-
-        # 2. 正则匹配 ID 和 歌名
-        # 例子: <a href="/mp3/14261b97130ea1ced8d12a890bd1cb1a.html" class="url" target="_mp3">G.E.M. 邓紫棋 - <font color='red'>来自天堂的魔鬼</font></a>
-        # 捕获组 1: ID
-        # 捕获组 2: 歌名 (含HTML标签)
-        pattern = r'href="/mp3/([a-f0-9]+)\.html"[^>]*>(.*?)</a>'
-        match = re.search(pattern, html, re.IGNORECASE)
-
-        if match:
+        results = []
+        for match in fetch_matches(session, search_url, SEARCH_PATTERN, limit):
             song_id = match.group(1)
             raw_title_html = match.group(2)
 
             # 清洗歌名中的 HTML 标签 (比如 <font color='red'>)
             clean_title = re.sub(r'<[^>]+>', '', raw_title_html).strip()
 
-            return {
+            results.append({
                 "id": song_id,  # 提取出的 ID，例如 14261b97...
                 "name": clean_title,  # 清洗后的歌名
                 "artist": "未知",  # 搜索页没直接给歌手，暂填未知或包含在标题里
                 "source": "thttt"
-            }
-        return None
+            })
+        return results
     except Exception as e:
         print(f"⚠️ [thttt] 搜索异常: {e}")
-        return None
+        return []
+
+
+def search(song_name):
+    results = search_all(song_name, 1)
+    return results[0] if results else None
 
 
 def get_play_url(song_id):
@@ -74,7 +75,7 @@ def get_play_url(song_id):
         }
 
         # 发送 POST 请求
-        resp = session.post(api_url, data=payload, headers=headers, timeout=10)
+        resp = session.post(api_url, data=payload, headers=headers)
 
         # 解析 JSON
         data = resp.json()
@@ -0,0 +1,143 @@
+import os
+import time
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .pool import POOL_SIZE
+from . import pool
+from . import ratelimit
+
+# === 传输层配置 ===
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))   # 建连超时 (秒)，源站不可达时尽快放弃
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))        # 读取超时 (秒)
+RETRIES = int(os.getenv("HTTP_RETRIES", "1"))                      # 建连失败 / 502-504 重试次数
+BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.3"))                  # 重试退避基数 (秒)，按 0.3, 0.6, 1.2... 递增
+HOST_POOLS = 8                                                      # 保留连接池的主机数，覆盖所有源站
+WINDOW = 100                                                        # 每个源保留最近多少次请求耗时
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+class _HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=WINDOW)
+
+    def to_dict(self):
+        ordered = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": ordered[len(ordered) // 2] if ordered else None,
+            "p90_ms": ordered[int(len(ordered) * 0.9)] if ordered else None
+        }
+
+
+class Transport:
+    """
+    所有驱动共用的 HTTP 传输层
+    一个 Session + 按主机划分的 keep-alive 连接池，每个主机的池大小与驱动线程池一致，并发时不会反复建连
+    建连/读取超时分开设置；建连失败和 502/503/504 按退避策略重试 (读超时不重试，交给对冲调度补发其他源)
+    每次请求记录耗时，可注册钩子接收 (驱动, 主机, 状态码, 耗时毫秒, 异常)
+    requests/urllib3 不支持 HTTP/2，各源站也都是 HTTP/1.1，这里靠连接复用省掉建连开销
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        retry = Retry(total=retries, connect=retries, read=0, status=retries, backoff_factor=backoff,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset(["GET", "POST"]),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=HOST_POOLS, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": DEFAULT_USER_AGENT})
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.lock = threading.Lock()
+        self.hosts = {}  # (driver, host) -> _HostStats
+        self.hooks = []
+        self.local = threading.local()  # 当前线程是否遇到过上游故障 (驱动内部会吞掉异常，熔断器靠它区分故障和无结果)
+
+    def add_hook(self, hook):
+        """hook(driver, host, status_code, elapsed_ms, error)，在请求线程中同步调用，应尽量轻量"""
+        self.hooks.append(hook)
+
+    def request(self, method, url, driver="", read_timeout=None, **kwargs):
+        kwargs.setdefault("timeout", (self.connect_timeout, read_timeout or self.read_timeout))
+        host = urlsplit(url).hostname or ""
+        start = time.time()
+        resp, error = None, None
+        try:
+            resp = self.session.request(method, url, **kwargs)
+            return resp
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # stream=True 时这里是首字节时间
+            elapsed = int((time.time() - start) * 1000)
+            with self.lock:
+                stats = self.hosts.setdefault((driver, host), _HostStats())
+                stats.requests += 1
+                if error or resp is None or resp.status_code >= 500:
+                    stats.errors += 1
+                    self.local.failed = True
+                stats.latencies.append(elapsed)
+            for hook in self.hooks:
+                try: hook(driver, host, resp.status_code if resp is not None else None, elapsed, error)
+                except Exception: pass
+
+    def reset_errors(self):
+        self.local.failed = False
+
+    def had_errors(self):
+        """自上次 reset_errors 以来，当前线程的请求是否出现过异常或 5xx"""
+        return getattr(self.local, "failed", False)
+
+    def client(self, driver, headers=None, read_timeout=None):
+        return DriverClient(self, driver, headers, read_timeout)
+
+    def stats(self):
+        with self.lock:
+            return {f"{driver}@{host}": s.to_dict() for (driver, host), s in self.hosts.items()}
+
+
+class DriverClient:
+    """驱动使用的轻量视图：带上该驱动的默认请求头和读超时，实际请求走共享的 Transport"""
+
+    def __init__(self, transport, driver, headers=None, read_timeout=None):
+        self.transport = transport
+        self.driver = driver
+        self.headers = dict(headers or {})
+        self.read_timeout = read_timeout
+
+    def request(self, method, url, headers=None, **kwargs):
+        # 竞速已结束就不再发请求 (包括 gdstudio 换 btwaf 后的重试)；每个上游请求都要先拿到该驱动的令牌
+        pool.check_cancelled()
+        ratelimit.admit(self.driver)
+        merged = dict(self.headers)
+        if headers: merged.update(headers)
+        resp = self.transport.request(method, url, driver=self.driver, read_timeout=self.read_timeout,
+                                      headers=merged, **kwargs)
+        # 等响应期间胜者已产生：丢掉响应并归还连接，不再解析
+        token = pool.current_token()
+        if token and token.cancelled:
+            resp.close()
+            raise pool.RaceCancelled()
+        return resp
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+transport = Transport()
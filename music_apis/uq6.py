@@ -1,11 +1,11 @@
-import requests
 import re
 from urllib.parse import quote
 
-# 创建 Session 保持连接
-session = requests.Session()
-session.headers.update({
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+from .html_stream import fetch_matches
+from .transport import transport
+
+# 走共享传输层 (连接池复用)，这里只带本站的请求头
+session = transport.client("uq6", headers={
     "Host": "www.6uq.cn",
     "Referer": "http://www.6uq.cn/",
     "Origin": "http://www.6uq.cn"
@@ -13,10 +13,14 @@ session.headers.update({
 
 BASE_URL = "http://www.6uq.cn"
 
+# 搜索结果链接，匹配 /play/ 和 .html 之间的字符串作为 ID
+# 示例: <div class="name"><a href="http://www.6uq.cn/play/d3Z3Zmpqd24.html" target="_mp3">G.E.M.&nbsp;邓紫棋《来自天堂的魔鬼》[MP3_LRC]</a></div>
+SEARCH_PATTERN = re.compile(r'class="name"><a href=".*?/play/([a-zA-Z0-9]+)\.html"[^>]*>(.*?)</a>', re.IGNORECASE)
 
-def search(song_name):
+
+def search_all(song_name, limit=3):
     """
-    搜索歌曲，解析 HTML 提取歌曲 ID
+    搜索歌曲，解析 HTML 提取前 limit 条结果的 ID
     目标格式: <a href="http://www.6uq.cn/play/{id}.html" ...>...</a>
     """
     try:
@@ -24,17 +28,9 @@ def search(song_name):
         # 搜索URL: http://www.6uq.cn/so/{encoded_name}.html
         search_url = f"{BASE_URL}/so/{quote(song_name)}.html"
 
-        resp = session.get(search_url, timeout=15)
-        resp.encoding = 'utf-8'
-        html = resp.text
-
-        # 2. 正则匹配 ID 和 歌名
-        # 示例: <div class="name"><a href="http://www.6uq.cn/play/d3Z3Zmpqd24.html" target="_mp3">G.E.M.&nbsp;邓紫棋《来自天堂的魔鬼》[MP3_LRC]</a></div>
-        # 匹配 /play/ 和 .html 之间的字符串作为 ID
-        pattern = r'class="name"><a href=".*?/play/([a-zA-Z0-9]+)\.html"[^>]*>(.*?)</a>'
-        match = re.search(pattern, html, re.IGNORECASE)
-
-        if match:
+        # 2. 边下载边匹配 ID 和 歌名，凑够 limit 条就断开
+        results = []
+        for match in fetch_matches(session, search_url, SEARCH_PATTERN, limit):
             song_id = match.group(1)
             raw_title = match.group(2)
 
@@ -46,16 +42,21 @@ def search(song_name):
             # 去除末尾的 [MP3_LRC] 等标记
             clean_title = re.sub(r'\[.*?\]', '', clean_title).strip()
 
-            return {
+            results.append({
                 "id": song_id,
                 "name": clean_title,
                 "artist": "未知",  # 搜索列表未分离歌手，通常包含在歌名中
                 "source": "sixuq"  # 内部标识
-            }
-        return None
+            })
+        return results
     except Exception as e:
         print(f"⚠️ [sixuq] 搜索异常: {e}")
-        return None
+        return []
+
+
+def search(song_name):
+    results = search_all(song_name, 1)
+    return results[0] if results else None
 
 
 def get_play_url(song_id):
@@ -80,7 +81,7 @@ def get_play_url(song_id):
         }
 
         # 发送 POST 请求
-        resp = session.post(api_url, data=payload, headers=headers, timeout=10)
+        resp = session.post(api_url, data=payload, headers=headers)
 
         # 解析 JSON
         data = resp.json()
@@ -0,0 +1,153 @@
+import random
+import threading
+from collections import OrderedDict
+
+import database
+
+REPEAT_MODES = ("all", "one", "off")
+
+
+class SeededPermutation:
+    """
+    [0, n) 上的伪随机排列，只保存几个轮密钥，内存与歌单长度无关
+    Feistel 网络在 2^k 范围内是双射，超出 n 的结果继续迭代 (cycle walking) 直到落回 [0, n)
+    """
+
+    def __init__(self, n, seed, rounds=4):
+        self.n = n
+        bits = max(2, (n - 1).bit_length())
+        bits += bits & 1
+        self.half = bits // 2
+        self.mask = (1 << self.half) - 1
+        rng = random.Random(seed)
+        self.keys = [rng.getrandbits(32) for _ in range(rounds)]
+
+    def _f(self, value, key):
+        x = (value * 0x9E3779B1 + key) & 0xFFFFFFFF
+        x ^= x >> 15
+        x = (x * 0x85EBCA6B) & 0xFFFFFFFF
+        x ^= x >> 13
+        return x & self.mask
+
+    def _encrypt(self, x):
+        left, right = x >> self.half, x & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._f(right, key)
+        return (left << self.half) | right
+
+    def _decrypt(self, x):
+        left, right = x >> self.half, x & self.mask
+        for key in reversed(self.keys):
+            left, right = right ^ self._f(left, key), left
+        return (left << self.half) | right
+
+    def __getitem__(self, index):
+        """播放顺序第 index 首 -> 歌单中的位置"""
+        x = index
+        while True:
+            x = self._encrypt(x)
+            if x < self.n: return x
+
+    def index(self, position):
+        """歌单中的位置 -> 播放顺序 (逆运算)"""
+        x = position
+        while True:
+            x = self._decrypt(x)
+            if x < self.n: return x
+
+
+class PlaylistQueue:
+    """
+    歌单播放队列：不把整张歌单读进内存，按播放位置从 SQLite 分窗口读取
+    顺序播放一次读 window 首，接着上一个窗口的最后一首 (added_at, id) 往后读；随机播放用 SeededPermutation 把播放序号映射到歌单位置，逐首读取
+    只缓存最近 window 首歌曲，current_index 语义与原来的列表下标一致
+    """
+
+    def __init__(self, playlist_name, shuffle=False, repeat="all", seed=None, window=100):
+        self.playlist_name = playlist_name
+        self.window = window
+        self.repeat = repeat if repeat in REPEAT_MODES else "all"
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()  # 歌单位置 -> song dict
+        self.playlist_id, self.count = database.get_playlist_info(playlist_name) or (None, 0)
+        self.shuffle = shuffle
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.cycle = 0
+        self.offset = 0
+        self.cursor = None  # 顺序窗口最后一首: (歌单位置, (added_at, id))
+        self._build_order()
+
+    def __len__(self):
+        return self.count
+
+    def _build_order(self):
+        # 每轮循环换一个种子，重复播放时顺序不一样
+        self.order = SeededPermutation(self.count, self.seed + self.cycle) if self.shuffle and self.count else None
+
+    def position(self, index):
+        """播放序号 -> 歌单位置"""
+        if not self.count: return None
+        index = (index + self.offset) % self.count
+        return self.order[index] if self.order else index
+
+    def song_at(self, index):
+        position = self.position(index)
+        if position is None: return None
+        with self.lock:
+            song = self.cache.get(position)
+            if song:
+                self.cache.move_to_end(position)
+                return song
+        # 顺序播放一次读一整个窗口，随机播放只读这一首
+        limit = 1 if self.order else self.window
+        after = None
+        with self.lock:
+            if not self.order and self.cursor and self.cursor[0] == position - 1:
+                after = self.cursor[1]
+        rows = database.fetch_playlist_window(self.playlist_id, position, limit, after) or []
+        with self.lock:
+            if rows and not self.order:
+                self.cursor = (position + len(rows) - 1, (rows[-1]['added_at'], rows[-1]['id']))
+            for i, row in enumerate(rows):
+                self.cache[position + i] = row
+                self.cache.move_to_end(position + i)
+            while len(self.cache) > self.window:
+                self.cache.popitem(last=False)
+        return rows[0] if rows else None
+
+    def upcoming(self, index, count):
+        """index 之后的 count 首 (预取用)"""
+        if not self.count: return []
+        count = min(count, self.count - 1)
+        songs = []
+        for i in range(index + 1, index + 1 + count):
+            if i >= self.count and self.repeat == "off": break
+            song = self.song_at(i % self.count)
+            if song: songs.append(song)
+        return songs
+
+    def next_cycle(self):
+        """播完一轮：重新读取歌曲数量 (期间可能增删)，随机模式换一个新顺序；按 id 读取，播放中改名不影响"""
+        self.count = (database.count_playlist_songs(self.playlist_id) or 0) if self.playlist_id else 0
+        self.cycle += 1
+        self.offset = 0
+        with self.lock:
+            self.cache.clear()
+            self.cursor = None
+        self._build_order()
+
+    def set_shuffle(self, shuffle, current_index):
+        """切换随机/顺序，当前歌曲和播放序号都保持不变 (上一首仍然可用)，返回新顺序中的序号"""
+        position = self.position(current_index) if 0 <= current_index < self.count else None
+        self.shuffle = shuffle
+        self.offset = 0
+        self._build_order()
+        if position is None: return current_index
+        # 用排列的逆运算找到当前歌曲在新顺序中的位置，再平移让它落在原序号上
+        index = self.order.index(position) if self.order else position
+        self.offset = (index - current_index) % self.count
+        return current_index
+
+    def stats(self):
+        with self.lock: cached = len(self.cache)
+        return {"count": self.count, "shuffle": self.shuffle, "repeat": self.repeat, "cached": cached}
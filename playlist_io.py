@@ -0,0 +1,131 @@
+import io
+import csv
+import json
+
+# 歌单批量导入/导出：支持纯文本 (每行一首)、CSV、JSON
+FORMATS = ("text", "csv", "json")
+
+
+def detect_format(fmt, content_type=""):
+    if fmt in FORMATS: return fmt
+    content_type = (content_type or "").lower()
+    if "json" in content_type: return "json"
+    if "csv" in content_type: return "csv"
+    return "text"
+
+
+# === 导入 (边读边解析，读完再写库) ===
+def _clean(name):
+    name = (name or "").strip()
+    return name or None
+
+
+def iter_text(stream):
+    for line in io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace"):
+        name = _clean(line)
+        if name: yield name
+
+
+def iter_csv(stream):
+    """有 name 表头时取该列，否则取第一列"""
+    reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline=""))
+    column = 0
+    first = True
+    for row in reader:
+        if not row: continue
+        if first:
+            first = False
+            header = [cell.strip().lower() for cell in row]
+            if "name" in header:
+                column = header.index("name")
+                continue
+        if column < len(row):
+            name = _clean(row[column])
+            if name: yield name
+
+
+def iter_json(stream, chunk_size=16384):
+    """
+    增量解析 JSON 数组：["歌名", {"name": "歌名"}, ...]，其他类型的元素跳过
+    每次读一块，解析出完整的元素就产出，不需要整个请求体都进内存
+    """
+    decoder = json.JSONDecoder()
+    reader = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace")
+    buf = ""
+    started = False
+    eof = False
+    while True:
+        buf = buf.lstrip(" \t\r\n,")
+        if not started and buf:
+            if buf[0] != "[": raise ValueError("JSON 需为数组")
+            started = True
+            buf = buf[1:]
+            continue
+        if started and buf.startswith("]"): return
+        try:
+            item, end = decoder.raw_decode(buf)
+        except ValueError:
+            if eof:
+                # 读到结尾仍未见到 "]"，说明上传不完整，整批回滚
+                if started or buf.strip(): raise ValueError("JSON 格式错误")
+                return
+            chunk = reader.read(chunk_size)
+            if not chunk: eof = True
+            buf += chunk
+            continue
+        buf = buf[end:]
+        # 只接受字符串和带字符串 name 的对象；null、数字、布尔等跳过，不当成歌名
+        if isinstance(item, dict): item = item.get("name")
+        if not isinstance(item, str): continue
+        name = _clean(item)
+        if name: yield name
+
+
+def parse_upload(stream, fmt):
+    return {"text": iter_text, "csv": iter_csv, "json": iter_json}[fmt](stream)
+
+
+def read_upload(stream, fmt):
+    """
+    把上传内容全部解析成歌名列表再交给数据库 (只保留歌名，5 万首也就几 MB)
+    边读边写的话，慢速上传期间一直占着写事务，日志等其他写入全部排队等待
+    格式错误统一抛 ValueError
+    """
+    try:
+        return list(parse_upload(stream, fmt))
+    except csv.Error as e:
+        raise ValueError(f"CSV 格式错误: {e}")
+
+
+# === 导出 (逐行产出) ===
+def export_text(songs):
+    for song in songs:
+        yield song['name'] + "\n"
+
+
+def export_csv(songs):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["name", "url", "added_at"])
+    for song in songs:
+        writer.writerow([song['name'], song['url'] or "", song['added_at']])
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    if out.getvalue(): yield out.getvalue()
+
+
+def export_json(songs):
+    yield "["
+    first = True
+    for song in songs:
+        yield ("" if first else ",") + json.dumps(song, ensure_ascii=False)
+        first = False
+    yield "]"
+
+
+EXPORTERS = {
+    "text": (export_text, "text/plain; charset=utf-8", "txt"),
+    "csv": (export_csv, "text/csv; charset=utf-8", "csv"),
+    "json": (export_json, "application/json", "json"),
+}
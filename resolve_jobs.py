@@ -0,0 +1,114 @@
+import time
+import threading
+import concurrent.futures
+
+import database
+
+
+class ResolveJob:
+    def __init__(self, playlist_name, force):
+        self.playlist_name = playlist_name
+        self.force = force
+        self.status = "running"  # running / done / cancelled / error
+        self.total = 0
+        self.done = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self.stale_before = 0
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def to_dict(self):
+        return {
+            "playlist": self.playlist_name,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class ResolveJobManager:
+    """
+    歌单批量预解析：后台把整个歌单逐首解析，链接/源/源内 ID/时长写回 playlist_songs
+    每首的结果按批落库，任务中断 (取消或重启) 后再次启动只处理还没解析、失败或过期的歌曲
+    resolve_fn(song_name, force) 返回 {"url", "source", "source_id", "duration"}，失败返回 None
+    """
+
+    def __init__(self, resolve_fn, concurrency=2, ttl=21600, batch_size=20):
+        self.resolve_fn = resolve_fn
+        self.concurrency = max(1, concurrency)
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.jobs = {}  # playlist_name -> ResolveJob (保留最近一次)
+
+    def start(self, playlist_name, force=False):
+        """启动任务；同一歌单已有任务在跑时直接返回该任务"""
+        with self.lock:
+            job = self.jobs.get(playlist_name)
+            if job and job.status == "running":
+                return job
+            job = ResolveJob(playlist_name, force)
+            # force 模式把任务开始前的结果都视为过期，全部重新解析
+            job.stale_before = job.started_at if force else job.started_at - self.ttl
+            job.total = database.count_unresolved_songs(playlist_name, job.stale_before) or 0
+            self.jobs[playlist_name] = job
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def cancel(self, playlist_name):
+        with self.lock:
+            job = self.jobs.get(playlist_name)
+        if not job or job.status != "running": return False
+        job.cancel_event.set()
+        return True
+
+    def get(self, playlist_name):
+        with self.lock:
+            return self.jobs.get(playlist_name)
+
+    def _resolve_one(self, job, song):
+        if job.cancel_event.is_set(): return None
+        try:
+            result = self.resolve_fn(song['name'], job.force)
+        except Exception as e:
+            print(f"⚠️ [预解析] {song['name']} 异常: {e}")
+            result = None
+        if not result:
+            return {"id": song['id'], "success": False}
+        return dict(result, id=song['id'], success=True)
+
+    def _run(self, job):
+        print(f"🧩 [预解析] 歌单 {job.playlist_name}: 待解析 {job.total} 首")
+        last_id = 0
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                while not job.cancel_event.is_set():
+                    songs = database.fetch_unresolved_songs(job.playlist_name, job.stale_before, last_id, self.batch_size)
+                    if not songs: break
+                    last_id = songs[-1]['id']
+
+                    results = []
+                    for result in executor.map(lambda song: self._resolve_one(job, song), songs):
+                        if result is None: continue  # 已取消
+                        results.append(result)
+                        job.done += 1
+                        if result['success']: job.succeeded += 1
+                        else: job.failed += 1
+                    if results:
+                        database.save_song_resolutions(results)
+            job.status = "cancelled" if job.cancel_event.is_set() else "done"
+        except Exception as e:
+            print(f"❌ [预解析] 歌单 {job.playlist_name} 任务异常: {e}")
+            job.status = "error"
+        job.finished_at = time.time()
+        print(f"🧩 [预解析] 歌单 {job.playlist_name} {job.status}: 成功 {job.succeeded} / 失败 {job.failed}")
+
+    def stats(self):
+        with self.lock:
+            return {name: job.to_dict() for name, job in self.jobs.items()}
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import types
+import tempfile
+
+import pytest
+
+# music_apis 会打开链接缓存库，指到临时目录
+os.environ.setdefault("URL_CACHE_DB", os.path.join(tempfile.mkdtemp(), "cache.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import music_apis
+from music_apis import scheduler, breaker
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(scheduler, "_stats", {})
+    monkeypatch.setattr(scheduler, "SCHEDULE_MODE", "hedge")
+    monkeypatch.setattr(scheduler, "EXPLORE_RATE", 0)
+    monkeypatch.setattr(breaker, "_breakers", {})
+
+
+def _warm(name, latency_ms):
+    for _ in range(scheduler.WARMUP_LAUNCHES):
+        scheduler.record_launch([name])
+        scheduler.record(name, True, latency_ms)
+
+
+def _driver(name, calls, delay):
+    def search(song_name):
+        calls.append(name)
+        time.sleep(delay)
+        return {"id": name, "name": song_name}
+    return types.SimpleNamespace(search=search, get_play_url=lambda song_id: f"http://example/{song_id}.mp3")
+
+
+def test_first_wave_is_best_driver_plus_cold_drivers():
+    _warm("a", 100)
+    _warm("b", 200)
+    ordered = scheduler.rank(["d", "b", "c", "a"])
+    assert ordered[:2] == ["a", "b"]
+    wave = scheduler.first_wave(ordered)
+    assert wave[0] == "a"
+    assert sorted(wave[1:]) == ["c", "d"]
+
+
+def test_first_wave_all_mode_launches_everything(monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHEDULE_MODE", "all")
+    assert scheduler.first_wave(["a", "b", "c"]) == ["a", "b", "c"]
+
+
+def test_race_launches_exactly_the_first_wave():
+    # a、b 已预热 (a 更快)，c、d 冷启动：首批应为 a + c + d，b 留给对冲
+    _warm("a", 100)
+    _warm("b", 200)
+    calls = []
+    drivers = {name: _driver(name, calls, 0.05 if name == "a" else 0.2) for name in ("a", "b", "c", "d")}
+    success, _, song_info, _, _ = music_apis._race("first wave", drivers, "test|first wave")
+    assert success and song_info["source_label"] == "a"
+    assert sorted(calls) == ["a", "c", "d"]